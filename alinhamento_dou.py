@@ -1,16 +1,23 @@
-import os, re, json, time
-import pandas as pd
-import gspread
-from gspread_dataframe import set_with_dataframe
-from google.oauth2.service_account import Credentials
-from google import genai
+import os, re, json, time, hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from string import Template
+from typing import TYPE_CHECKING
+
+from estado_local import CONTEUDO_DB, abre_armazem, abre_cache_abas, abre_cache_alinhamento
+from sheets_dou import abre_planilha, col_letra, gs_retry, lista_abas, versao_drive
+
+# pandas, gspread e o cliente do Gemini são carregados só quando há o que
+# classificar: uma passada sem linhas pendentes não precisa de nenhum deles.
+if TYPE_CHECKING:
+    import pandas as pd
 
 # CONFIG
 GENAI_API_KEY     = os.getenv("GENAI_API_KEY", "")
 MODEL_NAME        = "gemini-2.5-flash"
 PLANILHA_CLIENTES = os.getenv("PLANILHA_CLIENTES")
 SKIP_SHEETS       = {"Giro de notícias", "Mevo"}
+ARQUIVO_ABA_RX    = re.compile(r"^(?P<aba>.+) \d{4}$")  # abas de arquivo anual ("IEPS 2025")
 
 # Colunas esperadas
 COL_DATA     = "Data"
@@ -23,15 +30,22 @@ COL_CONTEUDO = "Conteúdo"
 COL_ALINH    = "Alinhamento"
 COL_JUST     = "Justificativa"
 COL_SECAO    = "Seção"
+COL_SIMILARES = "Similares"
+COL_CONTEUDO_ID = "Conteúdo ID"
+COL_CHAVE    = "Chave"  # oculta; chave de gravação do dou_unificado
 
 COLS_CANONICAL = [
     COL_DATA, COL_CLIENTE, COL_PALAVRA, COL_PORTARIA,
     COL_LINK, COL_RESUMO, COL_CONTEUDO,
-    COL_ALINH, COL_JUST, COL_SECAO,
+    COL_ALINH, COL_JUST, COL_SECAO, COL_SIMILARES, COL_CONTEUDO_ID, COL_CHAVE,
 ]
 
 BATCH_SIZE = int(os.getenv("ALIGN_BATCH", "25"))
 SLEEP_SEC  = float(os.getenv("ALIGN_SLEEP", "0.10"))
+ALIGN_WORKERS = int(os.getenv("ALIGN_WORKERS", "4"))  # chamadas ao Gemini em paralelo
+LOTE_PROMPT = int(os.getenv("ALIGN_LOTE_PROMPT", "8"))  # linhas por chamada; 1 = uma por vez
+# Mesmo ato (mesmo Link e Conteúdo) pendente em várias abas: uma chamada só, com todos os clientes.
+POR_LINK = os.getenv("ALIGN_POR_LINK", "1").strip().lower() in {"1", "true", "sim"}
 
 CLIENTE_DESCRICOES = {
     "IU": (
@@ -104,16 +118,8 @@ CLIENTE_DESCRICOES.setdefault("Reuna", CLIENTE_DESCRICOES["Reúna"])
 
 # ── PROMPT ────────────────────────────────────────────────────────────────────
 
-PROMPT = Template(
-"""Você é analista de políticas públicas e faz triagem de atos do DOU e matérias legislativas para um(a) cliente.
-
-Missão/escopo do cliente:
-$descricao
-
-Tarefa:
-Classificar o alinhamento do **Conteúdo** com a missão do cliente.
-
-Regras de evidência:
+# Regras e classes, comuns ao prompt de uma linha e ao de várias.
+_REGRAS = """Regras de evidência:
 - Use **apenas** o Conteúdo e a descrição do cliente acima. Não utilize conhecimento próprio sobre o cliente além do que está descrito neste prompt.
 - NÃO exija que o Conteúdo cubra TODA a missão do cliente.
   # Se o Conteúdo estiver claramente dentro de ao menos UMA frente/eixo relevante do cliente, marque "Alinha".
@@ -134,7 +140,18 @@ Restrições estruturais obrigatórias:
 - NÃO mencione que está classificando, analisando ou respondendo ao prompt.
 - A justificativa deve conter APENAS uma descrição objetiva do que o Conteúdo trata (objeto/tema).
 - NÃO explique impactos potenciais, intenções do autor ou interpretações jurídicas.
-- NÃO utilize linguagem avaliativa ou argumentativa.
+- NÃO utilize linguagem avaliativa ou argumentativa."""
+
+PROMPT = Template(
+"""Você é analista de políticas públicas e faz triagem de atos do DOU e matérias legislativas para um(a) cliente.
+
+Missão/escopo do cliente:
+$descricao
+
+Tarefa:
+Classificar o alinhamento do **Conteúdo** com a missão do cliente.
+
+""" + _REGRAS + """
 
 Formato de saída:
 Retorne **somente** JSON válido neste formato:
@@ -146,76 +163,222 @@ Retorne **somente** JSON válido neste formato:
 Conteúdo:
 <conteudo>
 $conteudo
-</conteudo>""".strip()
+</conteudo>"""
 )
 
+# Várias linhas da mesma aba num pedido só: a descrição do cliente e as regras,
+# a maior parte dos tokens, vão uma vez por lote e não uma vez por linha.
+PROMPT_LOTE = Template(
+"""Você é analista de políticas públicas e faz triagem de atos do DOU e matérias legislativas para um(a) cliente.
 
-def _gs_client():
-    raw = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
-    if raw:
-        info = json.loads(raw)
-        if "private_key" in info and "\\n" in info["private_key"]:
-            info["private_key"] = info["private_key"].replace("\\n", "\n")
-        scopes = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive",
-        ]
-        creds = Credentials.from_service_account_info(info, scopes=scopes)
-    else:
-        creds = Credentials.from_service_account_file(
-            "credentials.json",
-            scopes=[
-                "https://www.googleapis.com/auth/spreadsheets",
-                "https://www.googleapis.com/auth/drive",
-            ],
-        )
-    return gspread.authorize(creds)
+Missão/escopo do cliente:
+$descricao
 
+Tarefa:
+Classificar, um a um e de forma independente, o alinhamento de cada **Conteúdo** abaixo com a missão do cliente. Cada Conteúdo vem numa tag <conteudo id="..."> e deve ser julgado só pelo próprio texto.
 
-genai_client = genai.Client(api_key=GENAI_API_KEY)
+""" + _REGRAS + """
 
+Formato de saída:
+Retorne **somente** um array JSON válido, com exatamente um objeto por id recebido, neste formato:
+[
+  {
+    "id": "<id do conteudo>",
+    "alinhamento": "Alinha" | "Parcial" | "Não Alinha" | "Não se aplica",
+    "justificativa": "1–3 frases citando elementos do Conteúdo (termos/trechos) que sustentam a decisão"
+  }
+]
 
-def classify_text(cliente_nome: str, conteudo: str) -> dict:
-    if not str(conteudo or "").strip():
-        return {"alinhamento": "Parcial", "justificativa": "Conteúdo ausente ou vazio; não é possível concluir."}
+Conteúdos:
+$conteudos"""
+)
 
-    desc = CLIENTE_DESCRICOES.get(
-        cliente_nome,
-        f"Organização '{cliente_nome}' com foco temático conforme sua atuação pública.",
-    )
+# Um ato que caiu em várias abas: o Conteúdo vai uma vez, com a descrição de
+# cada cliente, e volta uma classificação por cliente.
+PROMPT_CLIENTES = Template(
+"""Você é analista de políticas públicas e faz triagem de atos do DOU e matérias legislativas para vários clientes.
+
+Clientes (missão/escopo de cada um):
+$descricoes
+
+Tarefa:
+Classificar o alinhamento do **Conteúdo** com a missão de cada cliente acima. Julgue cada cliente de forma independente, aplicando as regras abaixo como se ele fosse o único cliente e usando só a descrição dele.
+
+""" + _REGRAS + """
 
-    # Sanitiza o conteúdo para não quebrar o delimitador XML do prompt.
+Formato de saída:
+Retorne **somente** um objeto JSON válido, com exatamente uma chave por id de cliente recebido, neste formato:
+{
+  "<id do cliente>": {
+    "alinhamento": "Alinha" | "Parcial" | "Não Alinha" | "Não se aplica",
+    "justificativa": "1–3 frases citando elementos do Conteúdo (termos/trechos) que sustentam a decisão"
+  }
+}
+
+Conteúdo:
+<conteudo>
+$conteudo
+</conteudo>"""
+)
+
+CLASSES = ("Alinha", "Parcial", "Não Alinha", "Não se aplica")
+
+
+_GENAI_CLIENT = None
+
+
+def _genai_client():
+    global _GENAI_CLIENT
+    if _GENAI_CLIENT is None:
+        from google import genai
+        _GENAI_CLIENT = genai.Client(api_key=GENAI_API_KEY)
+    return _GENAI_CLIENT
+
+
+def _descricao(cliente_nome: str) -> str:
+    desc = CLIENTE_DESCRICOES.get(cliente_nome)
+    if desc is None:
+        return f"Organização '{cliente_nome}' com foco temático conforme sua atuação pública."
+    nome, texto = desc
+    return f"{nome}\n{texto}"
+
+
+def _sanitiza(conteudo: str) -> str:
     # Substitui </conteudo> por uma versão com zero-width space para neutralizar
     # qualquer fechamento prematuro da tag caso o texto do DOU contenha esse padrão.
-    conteudo_safe = conteudo.replace("</conteudo>", "</conteudo\u200b>")
+    return conteudo.replace("</conteudo>", "</conteudo\u200b>")
 
-    prompt = PROMPT.substitute(cliente=cliente_nome, descricao=desc, conteudo=conteudo_safe)
 
-    stream = genai_client.models.generate_content_stream(
+def _gera(prompt: str) -> str:
+    stream = _genai_client().models.generate_content_stream(
         model=MODEL_NAME,
         contents=prompt,
         config={"response_mime_type": "application/json"},
     )
-    raw = "".join((ch.text or "") for ch in stream).strip()
+    return "".join((ch.text or "") for ch in stream).strip()
+
+
+def _normaliza(data: dict) -> dict:
+    a = str(data.get("alinhamento", "")).strip()
+    j = str(data.get("justificativa", "")).strip()
+    if a not in CLASSES:
+        a = "Parcial"
+    if not j:
+        j = "Sem justificativa; revisar."
+    return {"alinhamento": a, "justificativa": j}
+
+
+_VAZIO = {"alinhamento": "Parcial", "justificativa": "Conteúdo ausente ou vazio; não é possível concluir."}
+
+
+def classify_text(cliente_nome: str, conteudo: str) -> dict:
+    if not str(conteudo or "").strip():
+        return dict(_VAZIO)
+
+    prompt = PROMPT.substitute(cliente=cliente_nome, descricao=_descricao(cliente_nome),
+                               conteudo=_sanitiza(conteudo))
+    raw = _gera(prompt)
 
     m = re.search(r"\{.*\}", raw, flags=re.S)
     if not m:
-        return {"alinhamento": "Parcial", "justificativa": "Saída sem JSON válido; revisão manual sugerida."}
+        return {"alinhamento": "Parcial", "justificativa": "Saída sem JSON válido; revisão manual sugerida.",
+                "falha": True}
 
     try:
-        data = json.loads(m.group(0))
-        a = str(data.get("alinhamento", "")).strip()
-        j = str(data.get("justificativa", "")).strip()
-        if a not in ("Alinha", "Parcial", "Não Alinha", "Não se aplica"):
-            a = "Parcial"
-        if not j:
-            j = "Sem justificativa; revisar."
-        return {"alinhamento": a, "justificativa": j}
+        return _normaliza(json.loads(m.group(0)))
     except Exception:
-        return {"alinhamento": "Parcial", "justificativa": "Falha ao interpretar JSON; revisão manual sugerida."}
+        return {"alinhamento": "Parcial", "justificativa": "Falha ao interpretar JSON; revisão manual sugerida.",
+                "falha": True}
+
+
+def classify_lote(cliente_nome: str, itens: list[tuple]) -> dict:
+    """Classifica vários conteúdos do mesmo cliente num pedido só.
+
+    itens é [(id, conteudo)]; devolve {id: resultado}. Item que volta faltando,
+    repetido ou com classe fora da lista é classificado de novo sozinho, por
+    classify_text; se a saída inteira não for um array JSON, todos são.
+    """
+    out = {i: dict(_VAZIO) for i, c in itens if not str(c or "").strip()}
+    itens = [(i, c) for i, c in itens if i not in out]
+    if len(itens) == 1:
+        i, c = itens[0]
+        out[i] = classify_text(cliente_nome, c)
+    if len(itens) <= 1:
+        return out
+
+    # ids curtos no prompt; o id de quem chamou pode ser qualquer coisa.
+    por_id = {str(n): i for n, (i, _) in enumerate(itens, 1)}
+    blocos = "\n\n".join(
+        f'<conteudo id="{n}">\n{_sanitiza(c)}\n</conteudo>' for n, (_, c) in enumerate(itens, 1)
+    )
+    prompt = PROMPT_LOTE.substitute(cliente=cliente_nome, descricao=_descricao(cliente_nome), conteudos=blocos)
+    raw = _gera(prompt)
 
+    vistos: dict = {}
+    repetidos = set()
+    m = re.search(r"\[.*\]", raw, flags=re.S)
+    try:
+        data = json.loads(m.group(0)) if m else []
+    except ValueError:
+        data = []
+    for item in data if isinstance(data, list) else []:
+        if not isinstance(item, dict):
+            continue
+        n = str(item.get("id", "")).strip()
+        a = str(item.get("alinhamento", "")).strip()
+        if n not in por_id or a not in CLASSES or not str(item.get("justificativa", "")).strip():
+            continue
+        if n in vistos:
+            repetidos.add(n)  # id repetido: não dá para saber qual vale
+        vistos[n] = _normaliza(item)
+    for n in repetidos:
+        del vistos[n]
+
+    faltam = [n for n in por_id if n not in vistos]
+    if faltam:
+        print(f"[{cliente_nome}] lote com {len(faltam)} de {len(por_id)} item(ns) inválido(s); "
+              "classificando um a um.")
+    for n, (i, c) in enumerate(itens, 1):
+        res = vistos.get(str(n))
+        out[i] = res if res is not None else classify_text(cliente_nome, c)
+    return out
+
+
+def classify_clientes(clientes: list[str], conteudo: str) -> dict:
+    """Classifica um conteúdo para vários clientes num pedido só; devolve {cliente: resultado}.
+
+    Cliente que volta faltando ou com classe fora da lista é classificado de
+    novo sozinho, por classify_text.
+    """
+    if not str(conteudo or "").strip():
+        return {c: dict(_VAZIO) for c in clientes}
+    if len(clientes) == 1:
+        return {clientes[0]: classify_text(clientes[0], conteudo)}
 
-def _ensure_cols(df: pd.DataFrame) -> pd.DataFrame:
+    descricoes = "\n\n".join(f'<cliente id="{c}">\n{_descricao(c)}\n</cliente>' for c in clientes)
+    raw = _gera(PROMPT_CLIENTES.substitute(descricoes=descricoes, conteudo=_sanitiza(conteudo)))
+
+    m = re.search(r"\{.*\}", raw, flags=re.S)
+    try:
+        data = json.loads(m.group(0)) if m else {}
+    except ValueError:
+        data = {}
+    out = {}
+    for c in clientes:
+        item = data.get(c) if isinstance(data, dict) else None
+        if (isinstance(item, dict) and str(item.get("alinhamento", "")).strip() in CLASSES
+                and str(item.get("justificativa", "")).strip()):
+            out[c] = _normaliza(item)
+    faltam = [c for c in clientes if c not in out]
+    if faltam:
+        print(f"[{', '.join(clientes)}] {len(faltam)} cliente(s) sem resposta válida; "
+              "classificando um a um.")
+    for c in faltam:
+        out[c] = classify_text(c, conteudo)
+    return out
+
+
+def _ensure_cols(df: "pd.DataFrame") -> "pd.DataFrame":
     for col in COLS_CANONICAL:
         if col not in df.columns:
             df[col] = ""
@@ -224,8 +387,24 @@ def _ensure_cols(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def pick_conteudo(row: pd.Series) -> str:
-    txt = str(row.get(COL_CONTEUDO, "") or "").strip()
+_ARMAZEM = None
+
+
+def _conteudo_integral(cid: str) -> str | None:
+    """Texto integral no armazém de conteúdo (DOU_CONTEUDO_DB), se houver."""
+    global _ARMAZEM
+    if not cid or not CONTEUDO_DB:
+        return None
+    if _ARMAZEM is None:
+        _ARMAZEM = abre_armazem()
+    return _ARMAZEM.le(cid)
+
+
+def pick_conteudo(row: "pd.Series") -> str:
+    # Com o armazém, a célula Conteúdo só tem um trecho; o texto inteiro vem pelo id.
+    txt = (_conteudo_integral(str(row.get(COL_CONTEUDO_ID, "") or "").strip()) or "").strip()
+    if not txt:
+        txt = str(row.get(COL_CONTEUDO, "") or "").strip()
     if not txt:
         txt = str(row.get(COL_RESUMO, "") or "").strip()
     if not txt:
@@ -233,18 +412,297 @@ def pick_conteudo(row: pd.Series) -> str:
     return txt
 
 
-def process_sheet(ws) -> None:
-    title = ws.title
+def _pendentes(header: list[str], rows: list[list]) -> list[int]:
+    """Índices das linhas sem Alinhamento e com Conteúdo, Resumo ou Portaria."""
+    idx = {c: header.index(c) for c in (COL_ALINH, COL_CONTEUDO, COL_RESUMO, COL_PORTARIA) if c in header}
+    i_alinh = idx[COL_ALINH]
+    fontes = [idx[c] for c in (COL_CONTEUDO, COL_RESUMO, COL_PORTARIA) if c in idx]
+    return [
+        n for n, r in enumerate(rows)
+        if not (i_alinh < len(r) and r[i_alinh].strip())
+        and any(i < len(r) and r[i].strip() for i in fontes)
+    ]
+
+
+def _pula(title: str, titulos) -> bool:
+    """Aba fora do alinhamento: as de SKIP_SHEETS e as de arquivo anual.
+
+    Arquivo é só "<aba> <ano>" de uma aba que existe na mesma planilha, como o
+    comando arquiva do dou_unificado as cria; um cliente cujo nome termine em
+    quatro dígitos continua sendo classificado.
+    """
     if title in SKIP_SHEETS:
-        print(f"[{title}] pulada.")
-        return
+        return True
+    m = ARQUIVO_ABA_RX.match(title)
+    return bool(m) and m.group("aba") in titulos
+
+
+def _prepara_aba(ws, values: list[list[str]] | None = None) -> tuple[list[list[str]] | None, tuple | None]:
+    """Lê a aba (se preciso) e separa as linhas pendentes.
 
-    values = ws.get_all_values()
+    Devolve (valores, trabalho). trabalho é (ws, header, rows, idxs) quando há
+    o que classificar. values, se vier, é a cópia da aba já conhecida (do
+    cache de cópias). Aba sem as colunas Alinhamento e Justificativa segue o
+    caminho antigo, de reescrita inteira, já aqui, e volta sem valores (não há
+    cópia a guardar).
+    """
+    title = ws.title
+    if values is None:
+        values = gs_retry(f"ler {title}", ws.get_all_values)
     if not values:
         print(f"[{title}] vazia.")
-        return
+        return values, None
+
+    header, rows = values[0], values[1:]
+    if COL_ALINH not in header or COL_JUST not in header:
+        _classifica_aba_inteira(ws)
+        return None, None
+
+    idxs = _pendentes(header, rows)
+    if not idxs:
+        print(f"[{title}] nenhuma linha pendente.")
+        return values, None
+    for i in idxs:
+        rows[i].extend([""] * (len(header) - len(rows[i])))
+    return values, (ws, header, rows, idxs)
+
+
+_HASH_PROMPT: dict[str, str] = {}
+
 
+def _chave_cache(cliente_nome: str, conteudo: str) -> tuple:
+    """Chave do cache de classificações: (cliente, hash do conteúdo, hash do prompt, modelo).
+
+    O hash do prompt cobre os três modelos de prompt e a descrição do cliente,
+    então mexer em qualquer um deles invalida o que foi guardado antes.
+    """
+    if cliente_nome not in _HASH_PROMPT:
+        texto = "\x1f".join((PROMPT.template, PROMPT_LOTE.template, PROMPT_CLIENTES.template,
+                              _descricao(cliente_nome)))
+        _HASH_PROMPT[cliente_nome] = hashlib.sha256(texto.encode("utf-8")).hexdigest()[:16]
+    return (cliente_nome, hashlib.sha256(conteudo.encode("utf-8")).hexdigest(),
+            _HASH_PROMPT[cliente_nome], MODEL_NAME)
+
+
+# Erros do Gemini que passam sozinhos: cota (429) e indisponibilidade (5xx),
+# além das quedas de rede (_erro_de_rede).
+_GENAI_TRANSITORIO = {429, 500, 502, 503, 504}
+_PAUSA = {"ate": 0.0}  # depois de um 429, todas as threads esperam até aqui
+_PAUSA_LOCK = threading.Lock()
+
+
+def _erro_de_rede(erro) -> bool:
+    """Queda de conexão ou timeout, do Python ou do httpx (o cliente HTTP do google-genai)."""
+    if isinstance(erro, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(erro, httpx.TransportError)
+
+
+def _genai_codigo(erro) -> int | None:
+    codigo = getattr(erro, "code", None)
+    if isinstance(codigo, int):
+        return codigo
+    m = re.match(r"\s*(\d{3})\b", str(erro))
+    return int(m.group(1)) if m else None
+
+
+def _chama(linhas: list, fn, *args) -> dict:
+    """fn(*args) com retry em erro transitório: 10s, 20s, 40s.
+
+    Um 429 pausa todas as threads, não só a que o recebeu. Se as quatro
+    tentativas falham, as linhas recebem um resultado de falha, que é gravado
+    mas não vai para o cache de classificações. Erro não transitório sobe.
+    """
+    for tentativa in range(4):
+        with _PAUSA_LOCK:
+            espera = _PAUSA["ate"] - time.time()
+        if espera > 0:
+            time.sleep(espera)
+        try:
+            res = fn(*args)
+            break
+        except Exception as e:
+            codigo = _genai_codigo(e)
+            if codigo not in _GENAI_TRANSITORIO and not _erro_de_rede(e):
+                raise
+            if tentativa == 3:
+                print(f"[gemini] erro {codigo or e}; {len(linhas)} linha(s) ficam marcadas para revisão.")
+                return {linha: {"alinhamento": "Parcial",
+                                "justificativa": "Falha na chamada ao Gemini; revisão manual sugerida.",
+                                "falha": True}
+                        for linha in linhas}
+            espera = 10 * (2 ** tentativa)
+            if codigo == 429:
+                with _PAUSA_LOCK:
+                    _PAUSA["ate"] = max(_PAUSA["ate"], time.time() + espera)
+            print(f"[gemini] erro {codigo or e}, tentativa {tentativa + 1}/4 falhou. Aguardando {espera}s...")
+            time.sleep(espera)
+    if SLEEP_SEC:
+        time.sleep(SLEEP_SEC)
+    return res
+
+
+def _classifica_link(linhas: list[tuple], conteudo: str) -> dict:
+    """Um ato pendente em várias abas: {(aba, i): resultado} de uma chamada só."""
+    res = classify_clientes(list(dict.fromkeys(t for t, _ in linhas)), conteudo)
+    return {(t, i): res[t] for t, i in linhas}
+
+
+def _agrupa_por_link(pendentes: dict) -> list[tuple]:
+    """Atos pendentes em mais de uma aba, como [(linhas, conteudo)], e os tira de pendentes.
+
+    pendentes é {(aba, i): (link, conteudo)}. O mesmo Link com Conteúdo
+    diferente (raro, mas uma aba pode ter um trecho e outra o texto todo) não
+    se junta.
+    """
+    grupos: dict = {}
+    for chave, (link, conteudo) in pendentes.items():
+        if link and conteudo.strip():
+            grupos.setdefault((link, conteudo), []).append(chave)
+    out = []
+    for (_, conteudo), linhas in grupos.items():
+        if len({t for t, _ in linhas}) < 2:
+            continue
+        for chave in linhas:
+            del pendentes[chave]
+        out.append((linhas, conteudo))
+    return out
+
+
+def _classifica_abas(trabalhos: list[tuple]) -> None:
+    """Classifica as linhas pendentes de todas as abas em paralelo e grava aba a aba.
+
+    Com DOU_CACHE_ALINHAMENTO, linha já classificada antes (mesmo cliente,
+    conteúdo, prompt e modelo) sai do cache, e linhas idênticas da mesma
+    passada viram uma chamada só. Com ALIGN_POR_LINK, um ato pendente em mais
+    de uma aba vai numa chamada só, com todos os clientes; o resto vai em
+    chamadas de até ALIGN_LOTE_PROMPT linhas da mesma aba. Até ALIGN_WORKERS
+    chamadas ficam em voo ao mesmo tempo. O texto de cada linha é montado
+    antes, nesta thread (o armazém de conteúdo e o cache são SQLite), e as
+    gravações também ficam nela: cada aba é gravada na ordem das linhas, em
+    lotes de BATCH_SIZE, assim que os resultados do lote chegam.
+    """
+    if not trabalhos:
+        return
+    cache = abre_cache_alinhamento()
+    pendentes = {}  # (aba, i) -> (link, conteudo), o que vai ao modelo
+    prontos = {}    # (aba, i) -> resultado já conhecido
+    chaves = {}     # (aba, i) -> chave no cache
+    repete = {}     # (aba, i) -> (aba, i) da linha idêntica que vai ao modelo
+    primeira = {}   # chave -> (aba, i)
+    for ws, header, rows, idxs in trabalhos:
+        print(f"[{ws.title}] classificando {len(idxs)} linha(s)...")
+        i_link = header.index(COL_LINK) if COL_LINK in header else None
+        for i in idxs:
+            linha = (ws.title, i)
+            link = rows[i][i_link].strip() if i_link is not None else ""
+            conteudo = pick_conteudo(dict(zip(header, rows[i])))
+            chave = chaves[linha] = _chave_cache(ws.title, conteudo)
+            res = cache.le(chave) if cache else None
+            if res is not None:
+                prontos[linha] = res
+            elif chave in primeira:
+                repete[linha] = primeira[chave]
+            else:
+                primeira[chave] = linha
+                pendentes[linha] = (link, conteudo)
+    if prontos or repete:
+        print(f"{len(prontos)} linha(s) do cache de classificações e {len(repete)} "
+              "repetida(s) nesta passada, sem chamada ao Gemini.")
+    grupos = _agrupa_por_link(pendentes) if POR_LINK else []
+    if grupos:
+        print(f"{len(grupos)} ato(s) pendente(s) em mais de uma aba; "
+              f"{sum(len(g) for g, _ in grupos)} linha(s) em uma chamada por ato.")
+
+    def resultado(linha: tuple) -> dict:
+        linha = repete.get(linha, linha)
+        if linha not in prontos:
+            res = prontos[linha] = futuros[linha].result()[linha]
+            if cache and not res.get("falha"):
+                cache.guarda(chaves[linha], res)
+        return prontos[linha]
+
+    if pendentes or grupos:
+        _genai_client()  # cria o cliente antes das threads
+    passo = max(1, LOTE_PROMPT)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, ALIGN_WORKERS)) as ex:
+            try:
+                futuros = {}
+                for linhas, conteudo in grupos:
+                    fut = ex.submit(_chama, linhas, _classifica_link, linhas, conteudo)
+                    for linha in linhas:
+                        futuros[linha] = fut
+                for ws, header, rows, idxs in trabalhos:
+                    resto = [(ws.title, i) for i in idxs if (ws.title, i) in pendentes]
+                    for ini in range(0, len(resto), passo):
+                        itens = [(linha, pendentes[linha][1]) for linha in resto[ini:ini + passo]]
+                        fut = ex.submit(_chama, [linha for linha, _ in itens], classify_lote, ws.title, itens)
+                        for linha, _ in itens:
+                            futuros[linha] = fut
+                for ws, header, rows, idxs in trabalhos:
+                    _grava_aba(ws, header, rows, idxs, resultado)
+            except BaseException:
+                # Sem isso a saída do with esperaria todas as chamadas da fila,
+                # gastando cota em resultados que ninguém vai gravar.
+                ex.shutdown(cancel_futures=True)
+                raise
+    finally:
+        if cache:
+            cache.fecha()
+
+
+def _grava_aba(ws, header: list[str], rows: list[list], idxs: list[int], resultado) -> None:
+    """Grava Alinhamento e Justificativa de rows[idxs], por lote, à medida que ficam prontos.
+
+    resultado((aba, i)) devolve a classificação da linha, esperando por ela se preciso.
+    """
+    from gspread.utils import rowcol_to_a1
+
+    i_alinh, i_just = header.index(COL_ALINH), header.index(COL_JUST)
+    for chunk_start in range(0, len(idxs), BATCH_SIZE):
+        chunk = idxs[chunk_start:chunk_start + BATCH_SIZE]
+        celulas = []
+        for i in chunk:
+            res = resultado((ws.title, i))
+            r = rows[i]
+            r[i_alinh], r[i_just] = res["alinhamento"], res["justificativa"]
+            celulas.append({"range": rowcol_to_a1(i + 2, i_alinh + 1), "values": [[r[i_alinh]]]})
+            celulas.append({"range": rowcol_to_a1(i + 2, i_just + 1), "values": [[r[i_just]]]})
+
+        # Células fixas, então repetir é seguro.
+        gs_retry(f"gravar {ws.title}", ws.batch_update, celulas,
+                 value_input_option="USER_ENTERED", _cota="escrita")
+        print(f"[{ws.title}] ✅ salvo até a linha {chunk[-1] + 2}")
+
+
+def process_sheet(ws, values: list[list[str]] | None = None) -> list[list[str]] | None:
+    """Classifica as linhas pendentes de uma aba e devolve os valores dela já atualizados."""
+    if _pula(ws.title, lista_abas(ws.spreadsheet)):
+        print(f"[{ws.title}] pulada.")
+        return None
+    values, trabalho = _prepara_aba(ws, values)
+    if trabalho:
+        _classifica_abas([trabalho])
+    return values
+
+
+def _classifica_aba_inteira(ws) -> None:
+    """Caminho de aba sem as colunas de alinhamento: relê, completa e reescreve a aba toda."""
+    title = ws.title
+    values = gs_retry(f"ler {title}", ws.get_all_values)
+    if not values:
+        print(f"[{title}] vazia.")
+        return
     header, rows = values[0], values[1:]
+
+    import pandas as pd
+    from gspread_dataframe import set_with_dataframe
+
     df = pd.DataFrame(rows, columns=header)
     df = _ensure_cols(df)
 
@@ -274,20 +732,168 @@ def process_sheet(ws) -> None:
             if SLEEP_SEC:
                 time.sleep(SLEEP_SEC)
 
-        set_with_dataframe(ws, df, include_index=False, include_column_header=True, resize=False)
+        # Reescreve a faixa inteira, então repetir é seguro. São até duas chamadas:
+        # um resize se a aba for menor que o DataFrame e a gravação das células.
+        gs_retry(f"gravar {title}", set_with_dataframe, ws, df, include_index=False,
+                 include_column_header=True, resize=False, _cota="escrita", _chamadas=2)
         ultima = idxs[min(chunk_start + BATCH_SIZE - 1, len(idxs) - 1)] + 2
         print(f"[{title}] ✅ salvo até a linha {ultima}")
 
 
+# Colunas comparadas com a cópia local. Conteúdo e Resumo não entram (seriam
+# lidos inteiros a cada passada); o Conteúdo ID muda junto com o texto
+# guardado no armazém, então cobre o Conteúdo das linhas gravadas pelo robô.
+IMPRESSAO_COLS = (COL_LINK, COL_ALINH, COL_CONTEUDO_ID)
+
+
+def _impressao_cols(header: list) -> list[int]:
+    return [header.index(c) for c in IMPRESSAO_COLS if c in header]
+
+
+def _pares(colunas: list[list]) -> list[tuple]:
+    """Uma tupla por linha com os valores das colunas lidas, sem as linhas vazias do fim."""
+    n = max(map(len, colunas), default=0)
+    colunas = [[(r[0] if r else "") for r in col] + [""] * (n - len(col)) for col in colunas]
+    pares = list(zip(*colunas))
+    vazia = ("",) * len(colunas)
+    while pares and pares[-1] == vazia:
+        pares.pop()
+    return pares
+
+
+def _pares_da_copia(valores: list[list[str]]) -> list[tuple]:
+    return _pares([[[r[i]] if i < len(r) else [] for r in valores[1:]]
+                   for i in _impressao_cols(valores[0])])
+
+
+def _sem_vazias(linha: list) -> list:
+    linha = list(linha)
+    while linha and linha[-1] == "":
+        linha.pop()
+    return linha
+
+
+class _CopiasAbas:
+    """Cópias locais das abas de clientes (DOU_CACHE_ABAS), para não reler o que não mudou.
+
+    Se a versão da planilha no Drive é a mesma da última passada, nenhuma aba
+    é lida. Se mudou, uma chamada lê o cabeçalho e as colunas de
+    IMPRESSAO_COLS (Link, Alinhamento e Conteúdo ID) de todas as abas com
+    cópia e compara com ela: igual, vale a cópia; linhas novas só no fim (modo
+    append) ou só no topo (modo topo), uma segunda chamada busca só essas
+    linhas; qualquer outra diferença faz a aba ser lida inteira, como sem o
+    cache.
+
+    A cópia só é conferida nessas colunas. Edição manual de Conteúdo, Resumo
+    ou outra coluna que não mude Link, Alinhamento nem Conteúdo ID não é
+    percebida: a passada usa o texto da cópia. Para forçar a releitura, apague
+    o DOU_CACHE_ABAS.
+    """
+
+    def __init__(self, sh):
+        self.sh = sh
+        self._cache = abre_cache_abas()
+        self._versao = None
+
+    def carrega(self, abas: list) -> dict[str, list[list[str]]]:
+        if self._cache is None:
+            return {}
+        from gspread.utils import absolute_range_name
+
+        self._versao = versao_drive(self.sh)
+        copias = {}
+        for ws in abas:
+            valores = self._cache.le(self.sh.id, ws.title)
+            if valores and COL_LINK in valores[0] and COL_ALINH in valores[0]:
+                copias[ws.title] = valores
+        if not copias:
+            return {}
+        if self._versao and self._versao == self._cache.versao(self.sh.id) and len(copias) == len(abas):
+            print(f"Planilha sem alterações desde a última passada (versão {self._versao}); usando as cópias.")
+            return copias
+
+        ranges, faixas = [], {}
+        for titulo, valores in copias.items():
+            cols = _impressao_cols(valores[0])
+            faixas[titulo] = (len(ranges), len(cols) + 1)
+            ranges.append(absolute_range_name(titulo, "1:1"))
+            ranges += [absolute_range_name(titulo, f"{col_letra(c)}2:{col_letra(c)}") for c in cols]
+        resp = gs_retry("ler impressões das abas", self.sh.values_batch_get, ranges)
+        lidas = [vr.get("values", []) for vr in resp.get("valueRanges", [])]
+        lidas += [[]] * (len(ranges) - len(lidas))
+
+        validas, parciais = {}, []
+        for titulo, valores in copias.items():
+            ini, qtd = faixas[titulo]
+            cab, *colunas = lidas[ini:ini + qtd]
+            if _sem_vazias(cab[0] if cab else []) != _sem_vazias(valores[0]):
+                continue
+            atual, antes = _pares(colunas), _pares_da_copia(valores)
+            m, k = len(atual), len(antes)
+            ultima = col_letra(len(valores[0]) - 1)
+            if atual == antes:
+                validas[titulo] = valores
+            elif m > k and atual[:k] == antes:
+                parciais.append((titulo, "fim", f"A{k + 2}:{ultima}{m + 1}"))
+            elif m > k and atual[m - k:] == antes:
+                parciais.append((titulo, "topo", f"A2:{ultima}{m - k + 1}"))
+
+        if parciais:
+            resp = gs_retry("ler linhas novas", self.sh.values_batch_get,
+                            [absolute_range_name(t, faixa) for t, _modo, faixa in parciais])
+            novas = [vr.get("values", []) for vr in resp.get("valueRanges", [])]
+            novas += [[]] * (len(parciais) - len(novas))
+            for (titulo, modo, _faixa), linhas in zip(parciais, novas):
+                valores = copias[titulo]
+                largura = len(valores[0])
+                linhas = [r + [""] * (largura - len(r)) for r in linhas]
+                validas[titulo] = valores + linhas if modo == "fim" else valores[:1] + linhas + valores[1:]
+                print(f"[{titulo}] {len(linhas)} linha(s) nova(s) lida(s); o resto veio da cópia.")
+
+        print(f"Cópias locais: {len(validas)} de {len(abas)} aba(s) sem leitura completa.")
+        return validas
+
+    def guarda(self, titulo: str, valores: list[list[str]] | None) -> None:
+        if self._cache is None:
+            return
+        if valores:
+            self._cache.guarda(self.sh.id, titulo, valores)
+        else:
+            self._cache.esquece(self.sh.id, titulo)
+
+    def fecha(self) -> None:
+        if self._cache is None:
+            return
+        # A versão lida antes das leituras: se algo mudou depois, a próxima
+        # passada vê outra versão e valida aba a aba.
+        self._cache.marca_versao(self.sh.id, self._versao)
+        self._cache.fecha()
+
+
 def main():
     if not PLANILHA_CLIENTES:
         raise SystemExit("Defina PLANILHA_CLIENTES (apenas a key).")
 
-    gc = _gs_client()
-    sh = gc.open_by_key(PLANILHA_CLIENTES)
-
-    for ws in sh.worksheets():
-        process_sheet(ws)
+    sh = abre_planilha(PLANILHA_CLIENTES, "planilha de clientes")
+    abas = list(lista_abas(sh).values())
+
+    copias = _CopiasAbas(sh)
+    titulos = {ws.title for ws in abas}
+    valores = copias.carrega([ws for ws in abas if not _pula(ws.title, titulos)])
+    preparadas, trabalhos = [], []
+    for ws in abas:
+        if _pula(ws.title, titulos):
+            print(f"[{ws.title}] pulada.")
+            continue
+        vals, trabalho = _prepara_aba(ws, valores.get(ws.title))
+        preparadas.append((ws.title, vals))
+        if trabalho:
+            trabalhos.append(trabalho)
+
+    _classifica_abas(trabalhos)
+    for titulo, vals in preparadas:
+        copias.guarda(titulo, vals)
+    copias.fecha()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,45 @@
+"""Mede o tempo de inicialização dos scripts do DOU.
+
+Cada módulo é importado num processo novo, várias vezes, e o script mostra a
+mediana do tempo de parede. É o custo que as rodadas curtas pagam antes de
+fazer qualquer trabalho (Extra sem edição nova, alinhamento sem pendências).
+
+Uso: python bench_inicializacao.py [repeticoes]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODULOS = ["dou_unificado", "alinhamento_dou"]
+
+
+def _mede(modulo: str, repeticoes: int) -> list[float]:
+    aqui = os.path.dirname(os.path.abspath(__file__))
+    tempos = []
+    for _ in range(repeticoes):
+        ini = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", f"import {modulo}"],
+            cwd=aqui,
+            check=True,
+        )
+        tempos.append(time.perf_counter() - ini)
+    return tempos
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    base = _mede("os", repeticoes)
+    print(f"{'interpretador':<16} mediana {statistics.median(base) * 1000:7.1f} ms")
+    for modulo in MODULOS:
+        tempos = _mede(modulo, repeticoes)
+        print(
+            f"{modulo:<16} mediana {statistics.median(tempos) * 1000:7.1f} ms "
+            f"(mín {min(tempos) * 1000:.1f}, máx {max(tempos) * 1000:.1f})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,16 @@
 import os
 import re
+import gzip
 import json
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 
 import requests
-import gspread
 from bs4 import BeautifulSoup
-from google.oauth2.service_account import Credentials
+
+from estado_local import abre_indice
+from perfil_dou import PERFIL_ATIVO, busca_perfilada, grava_perfil
+from sheets_dou import abre_planilha, busca_aba, col_letra, gs_retry, lista_abas
 
 try:
     from zoneinfo import ZoneInfo
@@ -21,6 +25,18 @@ today_dou = lambda: now_br().date().strftime("%d-%m-%Y")
 SHEET_ID = os.getenv("PLANILHA_CARGOS", "").strip()
 SHEET_NAME = os.getenv("SHEET_NAME", "").strip()  # se vazio: usa a primeira aba
 
+# "append" grava no fim da aba em vez de abrir linhas no topo; a ordem por data
+# fica na vista de filtro VISTA_RECENTES (python cargos_dou.py vistas).
+MODO_ESCRITA = os.getenv("DOU_MODO_ESCRITA", "topo").strip().lower()
+VISTA_RECENTES = "Mais recentes"
+
+# Dedupe por janela (como no dou_unificado): sem o índice local e no modo topo,
+# lê do topo em páginas crescentes até uma página inteira DOU_DEDUPE_JANELA_DIAS
+# dias mais velha que o achado mais antigo, em vez da aba inteira. 0 lê tudo, e
+# é o que usar na rodada seguinte a um backfill maior que uma página.
+DEDUPE_JANELA_DIAS = int(os.getenv("DOU_DEDUPE_JANELA_DIAS", "7"))
+DEDUPE_PAGINA = int(os.getenv("DOU_DEDUPE_PAGINA", "200"))
+
 if not SHEET_ID:
     raise RuntimeError("Env PLANILHA_CARGOS não definido.")
 
@@ -45,6 +61,11 @@ COLS = [
     "Título",
     "Trecho",
     "Conteúdo",
+    # um ato por linha da célula, na mesma ordem nas quatro colunas
+    "Verbo",
+    "Pessoa",
+    "Cargo",
+    "Órgão",
 ]
 
 # cargos-alvo
@@ -124,16 +145,6 @@ def _build_term_matchers(items: list[str]):
 
 CARGO_MATCHERS, CARGO_RX = _build_term_matchers(CARGOS_TERMO)
 
-def _termos_cargo_acionados(texto: str) -> list[str]:
-    base = _normalize_ws(texto)
-    if not base:
-        return []
-    out = []
-    for termo, rx in CARGO_MATCHERS:
-        if rx.search(base):
-            out.append(termo)
-    return _dedupe(out)
-
 def _sess():
     from requests.adapters import HTTPAdapter
     from urllib3.util.retry import Retry
@@ -157,14 +168,72 @@ HTTP = _sess()
 
 _CONTENT_CACHE: dict[str, str] = {}
 
+# Snapshot da rodada regular do dou_unificado.py (DOU_SNAPSHOT_DIR): listagem do
+# DO2 e o HTML do bloco texto-dou dos corpos que ela já baixou. O que estiver lá
+# não é raspado de novo; o resto vem da rede como antes.
+SNAPSHOT_DIR = os.getenv("DOU_SNAPSHOT_DIR", "").strip()
+_SNAPSHOT_BLOCOS: dict[str, str] = {}
+_ORIGEM_CORPO = {"snapshot": 0, "rede": 0}
+
+def _carrega_snapshot(data_str: str) -> dict[str, list[dict]]:
+    """Itens por seção do snapshot do dia; os blocos HTML vão para _SNAPSHOT_BLOCOS."""
+    if not SNAPSHOT_DIR:
+        return {}
+    caminho = os.path.join(SNAPSHOT_DIR, f"dou_{data_str}.jsonl.gz")
+    if not os.path.exists(caminho):
+        print(f"[snapshot] {caminho} não encontrado; raspando as seções.")
+        return {}
+
+    itens: dict[str, list[dict]] = {}
+    blocos: dict[str, str] = {}
+    try:
+        with gzip.open(caminho, "rt", encoding="utf-8") as f:
+            cab = json.loads(f.readline() or "{}")
+            if cab.get("versao") != 1 or cab.get("data") != data_str:
+                print(f"[snapshot] cabeçalho inesperado em {caminho}; ignorando.")
+                return {}
+            for sec in cab.get("secoes") or []:
+                itens[sec] = []
+            for linha in f:
+                reg = json.loads(linha)
+                if reg.get("tipo") == "item" and reg.get("secao") in itens:
+                    itens[reg["secao"]].append(reg)
+                elif reg.get("tipo") == "corpo" and reg.get("html"):
+                    blocos[DOU_MATERIA_BASE + reg.get("urlTitle", "")] = reg["html"]
+    except Exception as e:
+        print(f"[snapshot] falha ao ler {caminho}: {e}; raspando as seções.")
+        return {}
+
+    _SNAPSHOT_BLOCOS.update(blocos)
+    print(f"[snapshot] {caminho}: seções {', '.join(itens) or '-'}, {len(blocos)} corpos")
+    return itens
+
+def _texto_do_bloco(bloco) -> str:
+    txt = bloco.get_text("\n", strip=True)
+    txt = re.sub(r"[ \t]+", " ", txt).strip()
+    if CONTEUDO_MAX and len(txt) > CONTEUDO_MAX:
+        txt = txt[:CONTEUDO_MAX] + "…"
+    return txt
+
 def _baixar_conteudo_pagina(url: str) -> str:
     if not url:
         return ""
     if url in _CONTENT_CACHE:
         return _CONTENT_CACHE[url]
+
+    bloco_html = _SNAPSHOT_BLOCOS.pop(url, None)
+    if bloco_html:
+        bloco = BeautifulSoup(bloco_html, "html.parser").select_one("div.texto-dou")
+        if bloco:
+            txt = _texto_do_bloco(bloco)
+            _CONTENT_CACHE[url] = txt
+            _ORIGEM_CORPO["snapshot"] += 1
+            return txt
+
     try:
         r = HTTP.get(url, timeout=(10, 75), headers=HDR, allow_redirects=True)
         r.raise_for_status()
+        _ORIGEM_CORPO["rede"] += 1
         soup = BeautifulSoup(r.text, "html.parser")
         for t in soup(["script", "style", "noscript"]):
             t.decompose()
@@ -172,10 +241,7 @@ def _baixar_conteudo_pagina(url: str) -> str:
         # ALTERAÇÃO: em vez de filtrar por classes específicas, pega o texto inteiro do bloco texto-dou
         bloco = soup.select_one("article#materia div.texto-dou") or soup.select_one("div.texto-dou")
         if bloco:
-            txt = bloco.get_text("\n", strip=True)
-            txt = re.sub(r"[ \t]+", " ", txt).strip()
-            if CONTEUDO_MAX and len(txt) > CONTEUDO_MAX:
-                txt = txt[:CONTEUDO_MAX] + "…"
+            txt = _texto_do_bloco(bloco)
             _CONTENT_CACHE[url] = txt
             return txt
 
@@ -222,7 +288,12 @@ def _get_jsonarray_from_leitura(data_str: str, secao: str) -> list[dict]:
 
 def raspa_dou2_dia(data_str: str, secoes: list[str]) -> dict:
     combined = {"jsonArray": []}
+    snapshot = _carrega_snapshot(data_str)
     for sec in secoes:
+        if sec in snapshot:
+            combined["jsonArray"].extend(snapshot[sec])
+            print(f"[{sec}] itens: {len(snapshot[sec])} (snapshot)")
+            continue
         try:
             arr = _get_jsonarray_from_leitura(data_str, sec)
             combined["jsonArray"].extend(arr)
@@ -232,33 +303,134 @@ def raspa_dou2_dia(data_str: str, secoes: list[str]) -> dict:
     print(f"Total coletado (DO2/DO2E): {len(combined['jsonArray'])}")
     return combined
 
-RESOLVE_TRECHO_RX = re.compile(
-    r"\bRESOLVE\b\s*:?\s*(?P<trecho>.*?)(?=\bRESOLVE\b|\Z)", re.I | re.S
+# Uma varredura só acha todos os marcos do ato: RESOLVE, artigos e verbos-alvo.
+# Antes era um ".*?" DOTALL com lookahead por RESOLVE e depois VERBOS_RX e cada
+# regex de cargo de novo sobre o texto juntado; em DO2 de 45 mil caracteres isso
+# ficava lento e imprevisível.
+#
+# O artigo só conta no começo de parágrafo e com "Art." maiúsculo: citação no
+# meio da frase ("nos termos do art. 9º, inciso I, da Lei...") não é marco e
+# não pode cortar o ato antes da pessoa e do cargo.
+MARCOS_RX = re.compile(
+    r"(?P<resolve>\bRESOLVE\b\s*:?)|(?P<artigo>^[ \t]*(?-i:Art\.)\s*\d+)"
+    r"|(?P<verbo>\b(?:" + "|".join(VERBOS) + r")\b)",
+    re.I | re.M,
 )
 
-def _extrai_clipping(texto: str) -> dict | None:
-    if not texto:
+# Os mesmos termos de CARGO_MATCHERS, mas casando no texto cru (com hífen,
+# acento e caixa originais) para ter a posição de cada ocorrência.
+CARGO_CRU_RX = re.compile(
+    "|".join(
+        r"\b" + r"[^\w]+".join(map(re.escape, toks)) + r"\b"
+        for toks in (_normalize_ws(t).split() for t in CARGOS_TERMO) if toks
+    ),
+    re.I,
+)
+
+# nome em caixa alta logo depois do verbo (ex.: "NOMEAR MARIA DA SILVA, para...")
+PESSOA_RX = re.compile(r"[A-ZÀ-ÖØ-Ý][A-ZÀ-ÖØ-Ý'’\-]+(?:\s+[A-ZÀ-ÖØ-Ý][A-ZÀ-ÖØ-Ý'’\-]*)+")
+
+# onde o cargo termina e começa o órgão: " do Ministério...", " da Secretaria..."
+ORGAO_INICIO_RX = re.compile(
+    r"\s+d[oa]s?\s+(?=(?:minist|secretaria|subsecretaria|presid|casa\s+civil|advocacia|"
+    r"controladoria|gabinete|assessoria|diretoria|departamento|ag[eê]ncia|instituto|"
+    r"funda|conselho|comiss|consultoria|procuradoria|ouvidoria|corregedoria|superintend|coordena))",
+    re.I,
+)
+FIM_TRECHO_RX = re.compile(r"[,;]|\.(?:\s|$)|\bc[oó]digo\b", re.I)
+
+ATO_MAX = 800  # olha no máximo isso depois do verbo para achar pessoa/cargo/órgão
+
+def _segmenta(texto: str) -> list[dict]:
+    """Divide o ato em blocos RESOLVE, com os atos (verbo + trecho) de cada um.
+
+    Sem RESOLVE o texto inteiro é um bloco. Cada ato vai do verbo até o próximo
+    marco (verbo, artigo ou RESOLVE) ou o fim do bloco. Tempo linear no texto.
+    """
+    marcos = [(m.lastgroup, m.start(), m.end()) for m in MARCOS_RX.finditer(texto)]
+
+    resolves = [(ini, fim) for tipo, ini, fim in marcos if tipo == "resolve"]
+    if resolves:
+        limites = [
+            (fim, resolves[k + 1][0] if k + 1 < len(resolves) else len(texto))
+            for k, (_ini, fim) in enumerate(resolves)
+        ]
+    else:
+        limites = [(0, len(texto))]
+
+    blocos = []
+    j = 0
+    for b_ini, b_fim in limites:
+        while j < len(marcos) and marcos[j][1] < b_ini:
+            j += 1
+        atos = []
+        k = j
+        while k < len(marcos) and marcos[k][1] < b_fim:
+            tipo, ini, fim = marcos[k]
+            if tipo == "verbo":
+                prox = marcos[k + 1][1] if k + 1 < len(marcos) else len(texto)
+                atos.append({"verbo": texto[ini:fim], "ini": fim, "fim": min(prox, b_fim)})
+            k += 1
+        blocos.append({"ini": b_ini, "fim": b_fim, "atos": atos})
+    return blocos
+
+def _extrai_ato(texto: str, ato: dict) -> tuple[str, str, str, str] | None:
+    """(verbo, pessoa, cargo, órgão) de um ato; None se não tem cargo-alvo."""
+    ini, fim = ato["ini"], min(ato["fim"], ato["ini"] + ATO_MAX)
+    m_cargo = CARGO_CRU_RX.search(texto, ini, fim)
+    if not m_cargo:
         return None
 
-    resolves = [m.group("trecho") for m in RESOLVE_TRECHO_RX.finditer(texto)]
-    if not resolves:
-        resolves = [texto]
+    m_pessoa = PESSOA_RX.search(texto, ini, m_cargo.start())
+    pessoa = m_pessoa.group(0).strip() if m_pessoa else ""
+
+    m_fim = FIM_TRECHO_RX.search(texto, m_cargo.end(), fim)
+    fim_trecho = m_fim.start() if m_fim else fim
+    m_orgao = ORGAO_INICIO_RX.search(texto, m_cargo.end(), fim_trecho)
+    if m_orgao:
+        cargo = texto[m_cargo.start():m_orgao.start()]
+        orgao = texto[m_orgao.end():fim_trecho]
+    else:
+        cargo = texto[m_cargo.start():fim_trecho]
+        orgao = ""
+
+    return (
+        " ".join(ato["verbo"].upper().split()),
+        pessoa,
+        " ".join(cargo.split()),
+        " ".join(orgao.split()),
+    )
+
+def _termos_no_trecho(texto: str, ini: int, fim: int, achados: set):
+    for m in CARGO_CRU_RX.finditer(texto, ini, fim):
+        # termos contidos no que casou (ex.: "Assessoria Especial" dentro de
+        # "Chefe da Assessoria Especial") também contam
+        base = _normalize_ws(m.group(0))
+        for termo, rx in CARGO_MATCHERS:
+            if busca_perfilada("cargo", termo, rx, base) if PERFIL_ATIVO else rx.search(base):
+                achados.add(termo)
 
-    resolve_ok = []
-    for r in resolves:
-        if VERBOS_RX.search(r):
-            resolve_ok.append(_compact_ws(r))
+def _extrai_clipping(texto: str) -> dict | None:
+    if not texto:
+        return None
 
-    if not resolve_ok:
+    blocos = [b for b in _segmenta(texto) if b["atos"]]
+    if not blocos:
         return None
 
-    joined = "\n\n".join(resolve_ok)
-    verbos = _dedupe([v.upper() for v in VERBOS_RX.findall(joined)])
-    termos = _termos_cargo_acionados(joined)
+    joined = "\n\n".join(_compact_ws(texto[b["ini"]:b["fim"]]) for b in blocos)
+    verbos = _dedupe([a["verbo"].upper() for b in blocos for a in b["atos"]])
+
+    achados: set = set()
+    for b in blocos:
+        _termos_no_trecho(texto, b["ini"], b["fim"], achados)
+    termos = _dedupe([t for t in CARGOS_TERMO if t in achados])
 
     if not verbos or not termos:
         return None
 
+    atos = [t for b in blocos for a in b["atos"] if (t := _extrai_ato(texto, a))]
+
     trecho_final = joined
     if len(trecho_final) > 1800:
         trecho_final = trecho_final[:1800] + "…"
@@ -267,6 +439,10 @@ def _extrai_clipping(texto: str) -> dict | None:
         "Verbos acionados": "; ".join(verbos),
         "Termos de cargo": "; ".join(termos),
         "Trecho": trecho_final,
+        "Verbo": "\n".join(a[0] for a in atos),
+        "Pessoa": "\n".join(a[1] for a in atos),
+        "Cargo": "\n".join(a[2] for a in atos),
+        "Órgão": "\n".join(a[3] for a in atos),
     }
 
 def procura_cargos(conteudo_raspado: dict) -> list[dict]:
@@ -283,17 +459,17 @@ def procura_cargos(conteudo_raspado: dict) -> list[dict]:
         secao = (it.get("secao") or "").strip()
 
         pre = f"{titulo}\n{resumo}"
-        if EXCLUI_RUIDO_RX.search(pre):
+        if busca_perfilada("ruido", "EXCLUI_RUIDO_RX (titulo+resumo)", EXCLUI_RUIDO_RX, pre):
             continue
-        if not CARGO_RX.search(_normalize_ws(pre)):
+        if not busca_perfilada("cargo", "CARGO_RX (titulo+resumo)", CARGO_RX, _normalize_ws(pre)):
             continue
 
         conteudo_pagina = _baixar_conteudo_pagina(link)
         if not conteudo_pagina:
             continue
-        if EXCLUI_RUIDO_RX.search(conteudo_pagina[:2500]):
+        if busca_perfilada("ruido", "EXCLUI_RUIDO_RX (corpo)", EXCLUI_RUIDO_RX, conteudo_pagina[:2500]):
             continue
-        if not ORGAO_SINAL_RX.search(conteudo_pagina[:2500]):
+        if not busca_perfilada("orgao", "ORGAO_SINAL_RX", ORGAO_SINAL_RX, conteudo_pagina[:2500]):
             continue
 
         clip = _extrai_clipping(conteudo_pagina)
@@ -319,43 +495,65 @@ def procura_cargos(conteudo_raspado: dict) -> list[dict]:
             "Título": titulo,
             "Trecho": clip["Trecho"],
             "Conteúdo": conteudo_pagina,
+            "Verbo": clip["Verbo"],
+            "Pessoa": clip["Pessoa"],
+            "Cargo": clip["Cargo"],
+            "Órgão": clip["Órgão"],
         })
 
     return achados
 
-def _gs_client():
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    raw = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
-    if not raw:
-        raise RuntimeError("Secret GOOGLE_APPLICATION_CREDENTIALS_JSON não encontrado.")
-    info = json.loads(raw)
-    if "private_key" in info and "\\n" in info["private_key"]:
-        info["private_key"] = info["private_key"].replace("\\n", "\n")
-    creds = Credentials.from_service_account_info(info, scopes=scopes)
-    return gspread.authorize(creds)
-
 def _ensure_header(ws, header: list[str]):
-    current = ws.row_values(1)
+    current = gs_retry("ler cabeçalho", ws.row_values, 1)
     if not current:
-        ws.resize(rows=max(2, ws.row_count), cols=len(header))
-        ws.update("1:1", [header])
+        gs_retry("ajustar colunas", ws.resize, rows=max(2, ws.row_count), cols=len(header), _cota="escrita")
+        gs_retry("gravar cabeçalho", ws.update, "1:1", [header], _cota="escrita")
         return
     if current[: len(header)] == header:
         return
-    ws.resize(rows=max(2, ws.row_count), cols=max(ws.col_count, len(header)))
-    ws.update("1:1", [header])
+    gs_retry("ajustar colunas", ws.resize, rows=max(2, ws.row_count),
+             cols=max(ws.col_count, len(header)), _cota="escrita")
+    gs_retry("gravar cabeçalho", ws.update, "1:1", [header], _cota="escrita")
 
 def _get_first_worksheet(sh):
-    ws_list = sh.worksheets()
+    ws_list = list(lista_abas(sh).values())
     if not ws_list:
         raise RuntimeError("Planilha sem abas.")
     return ws_list[0]
 
-def _load_existing_keys(ws):
-    vals = ws.get_all_values()
+def _data_celula(valor: str):
+    for fmt in ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y"):
+        try:
+            return datetime.strptime((valor or "").strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def _le_topo(ws, limite) -> list[list[str]]:
+    """Cabeçalho e linhas do topo da aba, em páginas crescentes, até uma página toda passar de limite.
+
+    A página inteira, e não a última linha: depois de um backfill a Data não é
+    monótona a partir do topo.
+    """
+    ultima = col_letra(COLS.index("Link"))  # Data..Link são as primeiras colunas
+    vals = [COLS]
+    inicio, tamanho = 2, DEDUPE_PAGINA
+    while True:
+        pagina = gs_retry(f"ler topo de {ws.title}", ws.get, f"A{inicio}:{ultima}{inicio + tamanho - 1}")
+        pagina = [list(r) for r in pagina]
+        vals += pagina
+        datas = [d for d in (_data_celula(r[0]) for r in pagina if r) if d]
+        if len(pagina) < tamanho or (datas and max(datas) < limite):
+            break
+        inicio, tamanho = inicio + tamanho, tamanho * 2
+    print(f"dedupe por janela: {len(vals) - 1} linha(s) lidas do topo.")
+    return vals
+
+def _load_existing_keys(ws, limite=None):
+    if limite is not None:
+        vals = _le_topo(ws, limite)
+    else:
+        vals = gs_retry(f"ler {ws.title}", ws.get_all_values)
     if len(vals) <= 1:
         return set()
 
@@ -384,18 +582,31 @@ def salva_planilha(achados: list[dict]):
         print("sem itens de clipping.")
         return
 
-    gc = _gs_client()
-    sh = gc.open_by_key(SHEET_ID)
+    sh = abre_planilha(SHEET_ID, "planilha de cargos")
 
     if SHEET_NAME:
-        ws = sh.worksheet(SHEET_NAME)
+        ws = busca_aba(sh, SHEET_NAME)
     else:
         ws = _get_first_worksheet(sh)
 
-    _ensure_header(ws, COLS)
-    existing = _load_existing_keys(ws)
+    # Com o índice local reconciliado há pouco, nada é lido da aba antes de gravar.
+    indice = abre_indice("cargos", SHEET_ID)
+    if indice is not None and indice.confiavel(ws.title):
+        existing = indice.chaves(ws.title)
+    else:
+        _ensure_header(ws, COLS)
+        # Com o índice a leitura o reconcilia e precisa ser completa.
+        limite = None
+        datas = [_data_celula(a.get("Data", "")) for a in achados]
+        if indice is None and MODO_ESCRITA != "append" and DEDUPE_JANELA_DIAS > 0 and None not in datas:
+            limite = min(datas) - timedelta(days=DEDUPE_JANELA_DIAS)
+        existing = _load_existing_keys(ws, limite)
+        if indice is not None:
+            indice.substitui(ws.title, existing)
 
     rows = []
+    novas = []
+    vistos = set()
     add = 0
 
     for a in achados:
@@ -405,9 +616,10 @@ def salva_planilha(achados: list[dict]):
             _normalize_ws(a.get("Termos de cargo", "")),
             a.get("Link", ""),
         )
-        if k in existing:
+        if k in existing or k in vistos:
             continue
-        existing.add(k)
+        vistos.add(k)
+        novas.append(k)
 
         rows.append([
             a.get("Data", ""),
@@ -417,18 +629,77 @@ def salva_planilha(achados: list[dict]):
             a.get("Título", ""),
             a.get("Trecho", ""),
             a.get("Conteúdo", ""),
+            a.get("Verbo", ""),
+            a.get("Pessoa", ""),
+            a.get("Cargo", ""),
+            a.get("Órgão", ""),
         ])
         add += 1
 
     if not rows:
         print("nada novo.")
+        if indice is not None:
+            indice.fecha()
         return
 
-    ws.insert_rows(rows, row=2, value_input_option="USER_ENTERED")
+    if MODO_ESCRITA == "append":
+        gs_retry("anexar linhas", ws.append_rows, rows, value_input_option="USER_ENTERED",
+                 insert_data_option="INSERT_ROWS", table_range="A1", _escrita=True)
+    else:
+        # insert_rows abre as linhas e depois grava os valores: duas chamadas.
+        gs_retry("inserir linhas", ws.insert_rows, rows, row=2, value_input_option="USER_ENTERED",
+                 _escrita=True, _chamadas=2)
     print(f"+{add} linhas anexadas.")
+    if indice is not None:
+        indice.registra(ws.title, novas)
+        indice.fecha()
+
+def cria_vista():
+    """Cria a vista de filtro por Data decrescente na aba de cargos, se faltar."""
+    sh = abre_planilha(SHEET_ID, "planilha de cargos")
+    ws = busca_aba(sh, SHEET_NAME) if SHEET_NAME else _get_first_worksheet(sh)
+    meta = gs_retry("ler vistas", sh.fetch_sheet_metadata,
+                    params={"fields": "sheets(properties(sheetId),filterViews(title))"})
+    for aba in meta.get("sheets", []):
+        if aba.get("properties", {}).get("sheetId") != ws.id:
+            continue
+        if any(v.get("title") == VISTA_RECENTES for v in aba.get("filterViews", [])):
+            print(f"Vista '{VISTA_RECENTES}' já existe.")
+            return
+    gs_retry("criar vista", sh.batch_update, {"requests": [{"addFilterView": {"filter": {
+        "title": VISTA_RECENTES,
+        "range": {"sheetId": ws.id},
+        "sortSpecs": [{"dimensionIndex": COLS.index("Data"), "sortOrder": "DESCENDING"}],
+    }}}]}, _escrita=True)
+    print(f"Vista '{VISTA_RECENTES}' criada em {ws.title}.")
+
+def reconcilia_indice():
+    """Refaz o índice local de dedupe a partir da aba de cargos."""
+    indice = abre_indice("cargos", SHEET_ID)
+    if indice is None:
+        print("DOU_INDICE_DB não definido; nada a reconciliar.")
+        return
+    sh = abre_planilha(SHEET_ID, "planilha de cargos")
+    ws = busca_aba(sh, SHEET_NAME) if SHEET_NAME else _get_first_worksheet(sh)
+    _ensure_header(ws, COLS)
+    indice.substitui(ws.title, _load_existing_keys(ws))
+    indice.fecha()
+    print(f"Índice reconciliado (cargos): {ws.title}.")
 
 if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "reconcilia":
+        reconcilia_indice()
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "vistas":
+        cria_vista()
+        sys.exit(0)
+
     data_str = os.getenv("DOU_DATE", "").strip() or today_dou()
     conteudo = raspa_dou2_dia(data_str, secoes=["DO2", "DO2E"])
-    achados = procura_cargos(conteudo)
-    salva_planilha(achados)
+    try:
+        achados = procura_cargos(conteudo)
+        print(f"corpos: {_ORIGEM_CORPO['snapshot']} do snapshot, {_ORIGEM_CORPO['rede']} da rede")
+        salva_planilha(achados)
+    finally:
+        grava_perfil()
@@ -4,19 +4,22 @@ import re
 import json
 import html
 import time
+import gzip
+import hashlib
 import unicodedata
 import requests
-import gspread
 from bs4 import BeautifulSoup
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from collections import Counter
+from array import array
 
-from google.oauth2.service_account import Credentials
+from perfil_dou import PERFIL_ATIVO, busca_perfilada, grava_perfil
+from estado_local import CONTEUDO_DB, INDICE_DB, abre_armazem, abre_diario, abre_indice, trecho
+from sheets_dou import GS_ESCRITA_INCERTA, abre_planilha, busca_aba, col_letra, cria_aba, gs_codigo, gs_retry, lista_abas
 
-from brevo_python import ApiClient, Configuration
-from brevo_python.api.transactional_emails_api import TransactionalEmailsApi
-from brevo_python.models.send_smtp_email import SendSmtpEmail
-from brevo_python.rest import ApiException
+# gspread/google-auth e o SDK do Brevo são importados dentro das funções que os
+# usam. Juntos eles são a maior parte do tempo de inicialização, e as rodadas
+# curtas do Extra (edição vazia, nada novo) não chegam a precisar deles.
 
 # Timezone BR — evita raspar a data errada perto da meia-noite UTC.
 try:
@@ -286,8 +289,12 @@ _IDEC_IRRELEVANT_PATTERNS = [
 ]
 
 
-def _has_any(text_norm: str, patterns) -> bool:
-    return any(p and p.search(text_norm) for p in patterns)
+def _has_any(text_norm: str, patterns, grupo: str = "") -> bool:
+    if not PERFIL_ATIVO:
+        return any(p and p.search(text_norm) for p in patterns)
+    # O rótulo leva a posição na lista: padrões repetidos (a versão com e sem
+    # acento normaliza para o mesmo texto) aparecem separados no perfil.
+    return any(p and busca_perfilada(grupo, f"[{i}] {p.pattern}", p, text_norm) for i, p in enumerate(patterns))
 
 
 def _is_blocked(text: str) -> bool:
@@ -295,24 +302,21 @@ def _is_blocked(text: str) -> bool:
         return False
     nt = _normalize_ws(text)
 
-    for pat in EXCLUDE_PATTERNS:
-        if pat and pat.search(nt):
-            return True
+    if _has_any(nt, EXCLUDE_PATTERNS, "exclusao"):
+        return True
 
     # aplica o novo bloqueio aqui
-    for pat in _APOSENT_PATTERNS:
-        if pat and pat.search(nt):
-            return True
+    if _has_any(nt, _APOSENT_PATTERNS, "aposentadoria"):
+        return True
 
-    if _has_any(nt, _CNE_PATTERNS) and _has_any(nt, _CES_PATTERNS):
+    if _has_any(nt, _CNE_PATTERNS, "cne") and _has_any(nt, _CES_PATTERNS, "ces"):
         return True
 
-    if _DECISAO_CASE_REGEX.search(nt):
+    if busca_perfilada("decisao", "_DECISAO_CASE_REGEX", _DECISAO_CASE_REGEX, nt):
         return True
 
-    for pat in _PROF_RH_PATTERNS:
-        if pat.search(nt):
-            return True
+    if _has_any(nt, _PROF_RH_PATTERNS, "professor_rh"):
+        return True
 
     return False
 
@@ -344,8 +348,10 @@ def _is_idec_irrelevante(texto_bruto: str) -> bool:
 # Download de conteúdo
 # ---------------------------------------------------------------------------
 
-CONTEUDO_MAX = int(os.getenv("DOU_CONTEUDO_MAX", "49500"))
-_CONTENT_CACHE: dict[str, str] = {}
+# O corte existe por causa do limite de 50 mil caracteres da célula. Com o
+# armazém de conteúdo (DOU_CONTEUDO_DB) o texto não vai inteiro para a planilha,
+# então por padrão não é cortado.
+CONTEUDO_MAX = int(os.getenv("DOU_CONTEUDO_MAX", "0" if CONTEUDO_DB else "49500"))
 
 _HDR = {
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
@@ -357,10 +363,9 @@ _HDR = {
 
 
 def _baixar_conteudo_pagina(url: str) -> str:
+    """Baixa e extrai o corpo de uma matéria. Quem guarda o resultado é a Edicao."""
     if not url:
         return ""
-    if url in _CONTENT_CACHE:
-        return _CONTENT_CACHE[url]
     page_text = None
     for attempt in range(3):
         try:
@@ -385,6 +390,7 @@ def _baixar_conteudo_pagina(url: str) -> str:
             or soup.select_one("div.texto-dou")
         )
         if bloco:
+            _snapshot_corpo(url, str(bloco))
             ps = []
             for p in bloco.find_all(["p", "li"]):
                 cls = set(p.get("class") or [])
@@ -397,7 +403,6 @@ def _baixar_conteudo_pagina(url: str) -> str:
                 txt = re.sub(r"[ \t]+", " ", txt).strip()
                 if CONTEUDO_MAX and len(txt) > CONTEUDO_MAX:
                     txt = txt[:CONTEUDO_MAX] + "…"
-                _CONTENT_CACHE[url] = txt
                 return txt
 
         sels = [
@@ -416,19 +421,219 @@ def _baixar_conteudo_pagina(url: str) -> str:
         txt = re.sub(r"[ \t]+", " ", txt).strip()
         if CONTEUDO_MAX and len(txt) > CONTEUDO_MAX:
             txt = txt[:CONTEUDO_MAX] + "…"
-        _CONTENT_CACHE[url] = txt
         return txt
     except Exception as e:
         print(f"[conteudo] falha ao parsear {url}: {e}")
         return ""
 
 
+# ---------------------------------------------------------------------------
+# Edição em memória
+# ---------------------------------------------------------------------------
+
+URL_MATERIA = "https://www.in.gov.br/en/web/dou/-/"
+
+
+class Edicao:
+    """Itens de uma edição do DOU guardados em colunas.
+
+    Título, resumo, urlTitle e corpo de todos os itens ficam num único buffer
+    UTF-8, com o início e o fim de cada campo em arrays de offsets. Seção e data
+    são índices em tabelas pequenas. Do JSON da listagem só sobra o que os
+    matchers usam, e os corpos (baixados sob demanda) entram no mesmo buffer em
+    vez de ficarem soltos num dicionário de cache.
+
+    O objeto é só bytearray + arrays, então serializa barato com pickle para
+    mandar a processos auxiliares.
+    """
+
+    __slots__ = ("_buf", "_ini", "_fim", "_secoes", "_secao", "_datas", "_data")
+
+    _TITULO, _RESUMO, _URL, _CORPO = range(4)
+    _CAMPOS = 4
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._ini = array("q")
+        self._fim = array("q")
+        self._secoes: list[str] = []
+        self._secao = array("B")
+        self._datas: list[str] = []
+        self._data = array("H")
+
+    def __len__(self) -> int:
+        return len(self._secao)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield ItemEdicao(self, i)
+
+    @staticmethod
+    def _indice(tabela: list[str], valor: str) -> int:
+        try:
+            return tabela.index(valor)
+        except ValueError:
+            tabela.append(valor)
+            return len(tabela) - 1
+
+    def _grava(self, pos: int, texto: str) -> None:
+        dados = (texto or "").encode("utf-8")
+        self._ini[pos] = len(self._buf)
+        self._buf.extend(dados)
+        self._fim[pos] = len(self._buf)
+
+    def _texto(self, pos: int) -> str | None:
+        ini = self._ini[pos]
+        if ini < 0:
+            return None
+        return self._buf[ini:self._fim[pos]].decode("utf-8")
+
+    def adiciona(self, item: dict, secao: str) -> None:
+        base = len(self) * self._CAMPOS
+        self._ini.extend((-1,) * self._CAMPOS)
+        self._fim.extend((-1,) * self._CAMPOS)
+        self._grava(base + self._TITULO, item.get("title", "Título não disponível"))
+        self._grava(base + self._RESUMO, item.get("content", "") or "")
+        self._grava(base + self._URL, item.get("urlTitle", "") or "")
+        self._secao.append(self._indice(self._secoes, (secao or "").strip().upper()))
+        self._data.append(self._indice(self._datas, (item.get("pubDate", "") or "")[:10]))
+
+    def titulo(self, i: int) -> str:
+        return self._texto(i * self._CAMPOS + self._TITULO) or ""
+
+    def resumo(self, i: int) -> str:
+        return self._texto(i * self._CAMPOS + self._RESUMO) or ""
+
+    def url_title(self, i: int) -> str:
+        return self._texto(i * self._CAMPOS + self._URL) or ""
+
+    def secao(self, i: int) -> str:
+        return self._secoes[self._secao[i]]
+
+    def data(self, i: int) -> str:
+        return self._datas[self._data[i]]
+
+    def corpo(self, i: int, guarda: bool = True) -> str:
+        """Corpo da matéria; baixa na primeira vez e, com guarda, fica no buffer."""
+        pos = i * self._CAMPOS + self._CORPO
+        txt = self._texto(pos)
+        if txt is not None:
+            return txt
+        url_title = self.url_title(i)
+        txt = _baixar_conteudo_pagina(URL_MATERIA + url_title) if url_title else ""
+        # Falha de download não fica guardada: o próximo matcher tenta de novo,
+        # como acontecia com o cache por URL.
+        if txt and guarda:
+            self._grava(pos, txt)
+        return txt
+
+
+class ItemEdicao:
+    """Visão de um item da Edicao, sem copiar nada até o campo ser lido."""
+
+    __slots__ = ("_ed", "_i")
+
+    def __init__(self, edicao: Edicao, i: int):
+        self._ed = edicao
+        self._i = i
+
+    titulo = property(lambda self: self._ed.titulo(self._i))
+    resumo = property(lambda self: self._ed.resumo(self._i))
+    url_title = property(lambda self: self._ed.url_title(self._i))
+    secao = property(lambda self: self._ed.secao(self._i))
+    data = property(lambda self: self._ed.data(self._i))
+    link = property(lambda self: URL_MATERIA + self._ed.url_title(self._i))
+
+    def corpo(self, guarda: bool = True) -> str:
+        return self._ed.corpo(self._i, guarda=guarda)
+
+
+# ---------------------------------------------------------------------------
+# Snapshot da edição (reaproveitado pelo cargos_dou.py)
+# ---------------------------------------------------------------------------
+
+# Com DOU_SNAPSHOT_DIR, a rodada regular grava num JSONL gzip por data a
+# listagem das seções de DOU_SNAPSHOT_SECOES e o HTML do bloco texto-dou de cada
+# corpo que baixar. O DOU Cargos lê esse arquivo em vez de raspar o DO2 de novo
+# e só vai à rede pelo que faltar. Vai o HTML e não o texto porque os dois
+# scripts extraem o corpo de jeitos diferentes.
+SNAPSHOT_DIR = os.getenv("DOU_SNAPSHOT_DIR", "").strip()
+SNAPSHOT_SECOES = {
+    s.strip().upper() for s in (os.getenv("DOU_SNAPSHOT_SECOES") or "DO2,DO2E").split(",") if s.strip()
+}
+SNAPSHOT_VERSAO = 1
+
+_SNAPSHOT: dict | None = None
+
+
+def snapshot_caminho(data: str, diretorio: str = SNAPSHOT_DIR) -> str:
+    return os.path.join(diretorio, f"dou_{data}.jsonl.gz")
+
+
+def _snapshot_linha(f, reg: dict) -> None:
+    f.write(json.dumps(reg, ensure_ascii=False) + "\n")
+
+
+def abre_snapshot(edicao: Edicao | None, data: str) -> None:
+    """Começa o snapshot: cabeçalho e listagem já; os corpos entram ao baixar.
+
+    O arquivo é escrito ao lado e só troca de nome em fecha_snapshot, então quem
+    lê nunca pega um snapshot pela metade.
+    """
+    global _SNAPSHOT
+    if not SNAPSHOT_DIR or not edicao:
+        return
+
+    itens = [r for r in edicao if r.secao in SNAPSHOT_SECOES]
+    if not itens:
+        return
+    secoes = sorted({r.secao for r in itens})
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    final = snapshot_caminho(data)
+    tmp = final + ".tmp"
+    f = gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6)
+    _snapshot_linha(f, {"tipo": "cabecalho", "versao": SNAPSHOT_VERSAO, "data": data, "secoes": secoes})
+    for r in itens:
+        _snapshot_linha(f, {
+            "tipo": "item",
+            "secao": r.secao,
+            "title": r.titulo,
+            "content": r.resumo,
+            "urlTitle": r.url_title,
+            "pubDate": r.data,
+        })
+
+    _SNAPSHOT = {
+        "f": f, "tmp": tmp, "final": final,
+        "pendentes": {r.link for r in itens}, "itens": len(itens), "corpos": 0,
+    }
+
+
+def _snapshot_corpo(url: str, bloco_html: str) -> None:
+    if _SNAPSHOT is None or url not in _SNAPSHOT["pendentes"]:
+        return
+    _SNAPSHOT["pendentes"].discard(url)
+    _snapshot_linha(_SNAPSHOT["f"], {"tipo": "corpo", "urlTitle": url[len(URL_MATERIA):], "html": bloco_html})
+    _SNAPSHOT["corpos"] += 1
+
+
+def fecha_snapshot() -> None:
+    global _SNAPSHOT
+    if _SNAPSHOT is None:
+        return
+    snap, _SNAPSHOT = _SNAPSHOT, None
+    snap["f"].close()
+    os.replace(snap["tmp"], snap["final"])
+    print(f"[snapshot] {snap['final']}: {snap['itens']} itens, {snap['corpos']} corpos")
+
+
 # ---------------------------------------------------------------------------
 # Raspagem — edição regular e extra
 # ---------------------------------------------------------------------------
 
-def _raspa_secoes(data: str, secoes: list[str], campo_secao: str = "secao") -> dict | None:
-    combined: dict[str, list] = {"jsonArray": []}
+def _raspa_secoes(data: str, secoes: list[str]) -> Edicao | None:
+    edicao = Edicao()
 
     for sec in secoes:
         for attempt in range(3):
@@ -451,11 +656,12 @@ def _raspa_secoes(data: str, secoes: list[str], campo_secao: str = "secao") -> d
 
                 j = json.loads(raw_json)
                 arr = j.get("jsonArray", []) or []
+                n = 0
                 for it in arr:
                     if isinstance(it, dict):
-                        it[campo_secao] = sec
-                combined["jsonArray"].extend(arr)
-                print(f"[{sec}] itens: {len(arr)}")
+                        edicao.adiciona(it, sec)
+                        n += 1
+                print(f"[{sec}] itens: {n}")
                 break  # sucesso
 
             except Exception as e:
@@ -466,32 +672,32 @@ def _raspa_secoes(data: str, secoes: list[str], campo_secao: str = "secao") -> d
                 else:
                     print(f"[{sec}] falhou após 3 tentativas: {e}")
 
-    if combined["jsonArray"]:
-        print(f"Total coletado: {len(combined['jsonArray'])} itens")
-        return combined
+    if len(edicao):
+        print(f"Total coletado: {len(edicao)} itens")
+        return edicao
 
     print(f"Nenhum item encontrado nas seções: {secoes}")
     return None
 
 
-def raspa_dou(data: str | None = None, secoes: list[str] | None = None) -> dict | None:
+def raspa_dou(data: str | None = None, secoes: list[str] | None = None) -> Edicao | None:
     if data is None:
         data = now_br().strftime("%d-%m-%Y")
     if secoes is None:
         secoes = [s.strip() for s in (os.getenv("DOU_SECOES") or "DO1,DO2,DO3").split(",") if s.strip()]
     secoes = [s.upper() for s in secoes]
     print(f"Raspando edição regular — {data} — seções: {', '.join(secoes)}")
-    return _raspa_secoes(data, secoes, campo_secao="secao")
+    return _raspa_secoes(data, secoes)
 
 
-def raspa_dou_extra(data: str | None = None, secoes: list[str] | None = None) -> dict | None:
+def raspa_dou_extra(data: str | None = None, secoes: list[str] | None = None) -> Edicao | None:
     if data is None:
         data = now_br().strftime("%d-%m-%Y")
     if secoes is None:
         secoes = [s.strip() for s in (os.getenv("DOU_EXTRA_SECOES") or "DO1E,DO2E,DO3E").split(",") if s.strip()]
     secoes = [s.upper() for s in secoes]
     print(f"Raspando edição EXTRA — {data} — seções: {', '.join(secoes)}")
-    return _raspa_secoes(data, secoes, campo_secao="secao")
+    return _raspa_secoes(data, secoes)
 
 
 # ---------------------------------------------------------------------------
@@ -541,22 +747,20 @@ PALAVRAS_GERAIS = [
 _PATTERNS_GERAL = [(kw, _wholeword_pattern(kw)) for kw in PALAVRAS_GERAIS]
 
 
-def procura_termos(conteudo_raspado: dict | None, campo_secao: str = "secao") -> dict | None:
-    if not conteudo_raspado or "jsonArray" not in conteudo_raspado:
-        print("Nenhum conteúdo para analisar (geral).")
-        return None
+def itera_publicacoes(edicao: Edicao | None, guarda_corpo: bool = False):
+    """Publicações que passam pelos filtros comuns, uma por vez, com o corpo.
 
-    URL_BASE = "https://www.in.gov.br/en/web/dou/-/"
-    resultados_por_palavra: dict[str, list] = {kw: [] for kw in PALAVRAS_GERAIS}
-    algum = False
+    Os filtros são os mesmos para o monitor geral e para o de clientes, então o
+    corpo é baixado uma vez e casado com os dois na mesma passada. Com
+    guarda_corpo=False ele não fica na Edicao depois de usado.
+    """
+    if not edicao:
+        return
 
-    for r in conteudo_raspado["jsonArray"]:
-        titulo = r.get("title", "Título não disponível")
-        resumo = r.get("content", "")
-        link = URL_BASE + (r.get("urlTitle", "") or "")
-        data_pub = (r.get("pubDate", "") or "")[:10]
-        secao = (r.get(campo_secao, "") or "").strip().upper()
-        eh_secao_3 = secao in {"DO3", "DO3E"}
+    for r in edicao:
+        titulo = r.titulo
+        resumo = r.resumo
+        eh_secao_3 = r.secao in {"DO3", "DO3E"}
 
         # Na Seção 3, termos que antes eram excluídos (como "chamamento
         # público") passam a ser justamente parte do filtro de relevância.
@@ -568,33 +772,56 @@ def procura_termos(conteudo_raspado: dict | None, campo_secao: str = "secao") ->
         titulo_resumo_norm = _normalize_ws(titulo + " " + resumo)
 
         if eh_secao_3 and not any(
-            pat and pat.search(titulo_resumo_norm) for _termo, pat in _PATTERNS_SECAO_3
+            pat and (busca_perfilada("secao3", termo, pat, titulo_resumo_norm) if PERFIL_ATIVO
+                     else pat.search(titulo_resumo_norm))
+            for termo, pat in _PATTERNS_SECAO_3
         ):
             continue
 
-        # Busca a palavra-chave no conteúdo COMPLETO (título + resumo + corpo).
-        conteudo_pagina = _baixar_conteudo_pagina(link) if r.get("urlTitle") else ""
-        texto_norm = _normalize_ws(f"{titulo} {resumo} {conteudo_pagina or ''}")
+        yield r, r.corpo(guarda=guarda_corpo)
 
-        for palavra, patt in _PATTERNS_GERAL:
-            if not (patt and patt.search(texto_norm)):
-                continue
 
-            if palavra.strip().lower() == "bebidas alcoólicas":
-                if _is_bebidas_ato_irrelevante(f"{titulo}\n{resumo}\n{conteudo_pagina or ''}"):
-                    continue
+def casa_termos(r: ItemEdicao, conteudo_pagina: str):
+    """Gera (palavra, item) para cada palavra geral encontrada na publicação."""
+    titulo = r.titulo
+    resumo = r.resumo
+
+    # Busca a palavra-chave no conteúdo COMPLETO (título + resumo + corpo).
+    texto_norm = _normalize_ws(f"{titulo} {resumo} {conteudo_pagina or ''}")
+
+    for palavra, patt in _PATTERNS_GERAL:
+        if not (patt and (busca_perfilada("geral", palavra, patt, texto_norm) if PERFIL_ATIVO
+                          else patt.search(texto_norm))):
+            continue
 
-            if _is_ato_decisao_empresa_irrelevante(f"{titulo}\n{resumo}\n{conteudo_pagina or ''}"):
+        if palavra.strip().lower() == "bebidas alcoólicas":
+            if _is_bebidas_ato_irrelevante(f"{titulo}\n{resumo}\n{conteudo_pagina or ''}"):
                 continue
 
-            resultados_por_palavra[palavra].append({
-                "date": data_pub,
-                "title": titulo,
-                "href": link,
-                "abstract": resumo,
-                "content_page": conteudo_pagina or "",
-                "secao": secao,
-            })
+        if _is_ato_decisao_empresa_irrelevante(f"{titulo}\n{resumo}\n{conteudo_pagina or ''}"):
+            continue
+
+        yield palavra, {
+            "date": r.data,
+            "title": titulo,
+            "href": r.link,
+            "abstract": resumo,
+            "content_page": conteudo_pagina or "",
+            "secao": r.secao,
+        }
+
+
+def procura_termos(edicao: Edicao | None) -> dict | None:
+    if not edicao:
+        print("Nenhum conteúdo para analisar (geral).")
+        return None
+
+    resultados_por_palavra: dict[str, list] = {kw: [] for kw in PALAVRAS_GERAIS}
+    algum = False
+
+    for r, conteudo_pagina in itera_publicacoes(edicao, guarda_corpo=True):
+        for palavra, item in casa_termos(r, conteudo_pagina):
+            resultados_por_palavra[palavra].append(item)
             algum = True
 
     if not algum:
@@ -651,119 +878,158 @@ for _cli, _kws in CLIENT_KEYWORDS.items():
             CLIENT_PATTERNS.append((_pat, _cli, _kw))
 
 
-def procura_termos_clientes(conteudo_raspado: dict | None, campo_secao: str = "secao") -> dict[str, list]:
-    if not conteudo_raspado or "jsonArray" not in conteudo_raspado:
-        print("Nenhum conteúdo para analisar (clientes).")
-        return {}
-
-    URL_BASE = "https://www.in.gov.br/en/web/dou/-/"
-    agreg: dict[tuple, dict] = {}
+def casa_termos_clientes(r: ItemEdicao, conteudo_pagina: str) -> list[tuple[str, list]]:
+    """[(cliente, linha)] da publicação, uma linha por cliente com as keywords juntas."""
+    titulo = r.titulo
+    resumo = r.resumo
 
-    for r in conteudo_raspado["jsonArray"]:
-        titulo = r.get("title", "Título não disponível")
-        resumo = r.get("content", "")
-        link = URL_BASE + (r.get("urlTitle", "") or "")
-        data_pub = (r.get("pubDate", "") or "")[:10]
-        secao = (r.get(campo_secao, "") or "").strip().upper()
-        eh_secao_3 = secao in {"DO3", "DO3E"}
+    # Busca as keywords do cliente no conteúdo COMPLETO (título + resumo + corpo).
+    texto_norm = _normalize_ws(f"{titulo} {resumo} {conteudo_pagina or ''}")
 
-        if not link:
-            continue
-        # Na Seção 3, termos que antes eram excluídos (como "chamamento
-        # público") passam a ser justamente parte do filtro de relevância.
-        if not eh_secao_3 and _is_blocked(titulo + " " + resumo):
+    hits = []
+    for pat, cliente, kw in CLIENT_PATTERNS:
+        if not (busca_perfilada("cliente", f"{cliente}: {kw}", pat, texto_norm) if PERFIL_ATIVO
+                else pat.search(texto_norm)):
             continue
+        hits.append((cliente, kw))
 
-        titulo_resumo_norm = _normalize_ws(titulo + " " + resumo)
+    if not hits:
+        return []
 
-        if eh_secao_3 and not any(
-            pat and pat.search(titulo_resumo_norm) for _termo, pat in _PATTERNS_SECAO_3
-        ):
-            continue
+    alltxt = f"{titulo}\n{resumo}\n{conteudo_pagina or ''}"
 
-        # Busca as keywords do cliente no conteúdo COMPLETO (título + resumo + corpo).
-        conteudo_pagina = _baixar_conteudo_pagina(link) if r.get("urlTitle") else ""
-        texto_norm = _normalize_ws(f"{titulo} {resumo} {conteudo_pagina or ''}")
+    if any(kw.strip().lower() == "bebidas alcoólicas" for _, kw in hits):
+        if _is_bebidas_ato_irrelevante(alltxt):
+            return []
 
-        hits = []
-        for pat, cliente, kw in CLIENT_PATTERNS:
-            if not pat.search(texto_norm):
-                continue
-            hits.append((cliente, kw))
+    if _is_ato_decisao_empresa_irrelevante(alltxt):
+        return []
 
-        if not hits:
+    kws_por_cliente: dict[str, set] = {}
+    for cliente, kw in hits:
+        if cliente == "IDEC" and _is_idec_irrelevante(alltxt):
             continue
+        kws_por_cliente.setdefault(cliente, set()).add(kw)
+
+    out = []
+    for cliente, kws in kws_por_cliente.items():
+        kws_join = "; ".join(sorted(kws, key=lambda x: _normalize_ws(x)))
+        out.append((cliente, [
+            r.data,
+            cliente,
+            kws_join,
+            titulo,
+            r.link,
+            resumo,
+            conteudo_pagina or "",
+            "",
+            "",
+            r.secao,
+            "",
+            "",
+        ]))
+    return out
 
-        alltxt = f"{titulo}\n{resumo}\n{conteudo_pagina or ''}"
 
-        if any(kw.strip().lower() == "bebidas alcoólicas" for _, kw in hits):
-            if _is_bebidas_ato_irrelevante(alltxt):
+def procura_termos_clientes(edicao: Edicao | None) -> dict[str, list]:
+    if not edicao:
+        print("Nenhum conteúdo para analisar (clientes).")
+        return {}
+
+    por_cliente: dict[str, list] = {c: [] for c in CLIENT_KEYWORDS}
+    vistos: set[tuple] = set()
+    for r, conteudo_pagina in itera_publicacoes(edicao, guarda_corpo=True):
+        for cliente, row in casa_termos_clientes(r, conteudo_pagina):
+            key = (cliente, r.link)
+            if key in vistos:
                 continue
+            vistos.add(key)
+            por_cliente[cliente].append(row)
 
-        if _is_ato_decisao_empresa_irrelevante(alltxt):
-            continue
+    return por_cliente
 
-        for cliente, kw in hits:
-            if cliente == "IDEC" and _is_idec_irrelevante(alltxt):
-                continue
-            key = (cliente, link)
-            if key not in agreg:
-                agreg[key] = {
-                    "date": data_pub,
-                    "cliente": cliente,
-                    "kws": set(),
-                    "title": titulo,
-                    "href": link,
-                    "abstract": resumo,
-                    "content_page": conteudo_pagina or "",
-                    "secao": secao,
-                }
-            agreg[key]["kws"].add(kw)
 
-    por_cliente: dict[str, list] = {c: [] for c in CLIENT_KEYWORDS}
-    for (_cli, _href), d in agreg.items():
-        kws_join = "; ".join(sorted(d["kws"], key=lambda x: _normalize_ws(x)))
-        por_cliente[d["cliente"]].append([
-            d["date"],
-            d["cliente"],
-            kws_join,
-            d["title"],
-            d["href"],
-            d["abstract"],
-            d["content_page"],
-            "",
-            "",
-            d["secao"],
-        ])
+# ---------------------------------------------------------------------------
+# Quase duplicatas
+# ---------------------------------------------------------------------------
 
-    return por_cliente
+# O DOU publica no mesmo dia atos quase idênticos: a mesma portaria para vários
+# órgãos, retificações, editais repetidos. Cada um virava uma linha na planilha,
+# uma chamada ao Gemini e um item no e-mail. Depois do casamento das palavras,
+# os atos são agrupados pelo SimHash do corpo normalizado: fica o primeiro da
+# edição como representante e os outros entram na coluna "Similares".
+SIMILARES_MAX_BITS = int(os.getenv("DOU_SIMILARES_BITS", "6"))  # 0 desliga
+_SIMHASH_SHINGLE = 3
+# Com poucos tokens (só título e resumo) o SimHash junta atos que não têm nada a
+# ver; abaixo disso o ato nunca é agrupado.
+_SIMHASH_MIN_TOKENS = 30
+
+
+def _simhash(texto: str) -> int | None:
+    """SimHash de 64 bits sobre shingles de 3 palavras do texto normalizado."""
+    toks = _normalize_ws(texto).split()
+    if len(toks) < _SIMHASH_MIN_TOKENS:
+        return None
+    hashes = {
+        hashlib.blake2b(" ".join(toks[i:i + _SIMHASH_SHINGLE]).encode(), digest_size=8).hexdigest()
+        for i in range(len(toks) - _SIMHASH_SHINGLE + 1)
+    }
+    metade = len(hashes) / 2
+    assinatura = 0
+    # zip(*...) conta cada bit em todas as shingles de uma vez, sem laço de 64
+    # iterações por shingle em Python.
+    for coluna in zip(*(format(int(h, 16), "064b") for h in hashes)):
+        assinatura = (assinatura << 1) | (coluna.count("1") > metade)
+    return assinatura
+
+
+class _Similares:
+    """Representantes de cada grupo (palavra ou cliente) nesta rodada.
+
+    Guarda só a assinatura, a chave de dedupe e o item compacto do e-mail, então
+    o custo não cresce com o tamanho dos corpos. Só é representante quem vai
+    virar linha nesta rodada: o primeiro do grupo na ordem da edição que ainda
+    não estava na planilha. Um ato que já estava (gravado por uma rodada
+    anterior do Extra) sai com remove() e os similares ligados a ele voltam a
+    entrar sozinhos.
+    """
+
+    def __init__(self):
+        self._reps: dict[tuple, list[tuple[int, tuple, dict]]] = {}
+
+    def representante(self, grupo: tuple, sig: int | None) -> tuple[tuple, dict] | None:
+        """(chave, item) do representante próximo de sig no grupo, ou None."""
+        if sig is None or SIMILARES_MAX_BITS <= 0:
+            return None
+        for sig_rep, chave, item in self._reps.get(grupo, []):
+            if (sig ^ sig_rep).bit_count() <= SIMILARES_MAX_BITS:
+                return chave, item
+        return None
+
+    def registra(self, grupo: tuple, sig: int | None, chave: tuple, item: dict) -> None:
+        if sig is not None:
+            self._reps.setdefault(grupo, []).append((sig, chave, item))
+
+    def remove(self, aba: str, chave: tuple) -> None:
+        for grupo, reps in self._reps.items():
+            if grupo[0] == aba:
+                reps[:] = [r for r in reps if r[1] != chave]
 
 
 # ---------------------------------------------------------------------------
 # Google Sheets
 # ---------------------------------------------------------------------------
 
-def _gs_client_from_env():
-    raw = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    if not raw:
-        jf = "credentials.json"
-        if os.path.exists(jf):
-            creds = Credentials.from_service_account_file(jf, scopes=scopes)
-            return gspread.authorize(creds)
-        raise RuntimeError("Secret GOOGLE_APPLICATION_CREDENTIALS_JSON não encontrado.")
-    info = json.loads(raw)
-    if "private_key" in info and "\\n" in info["private_key"]:
-        info["private_key"] = info["private_key"].replace("\\n", "\n")
-    creds = Credentials.from_service_account_info(info, scopes=scopes)
-    return gspread.authorize(creds)
+# Chave: hash da chave de dedupe da linha, numa coluna oculta. Depois de um 500
+# na gravação, é ela que é relida para reenviar só as linhas que não chegaram.
+COL_CHAVE = "Chave"
+COLS_GERAL = ["Data", "Palavra-chave", "Portaria", "Link", "Resumo", "Conteúdo", "Seção", "Similares", "Conteúdo ID", COL_CHAVE]
+COLS_CLIENTE = ["Data", "Cliente", "Palavra-chave", "Portaria", "Link", "Resumo", "Conteúdo", "Alinhamento", "Justificativa", "Seção", "Similares", "Conteúdo ID", COL_CHAVE]
 
 
-COLS_GERAL = ["Data", "Palavra-chave", "Portaria", "Link", "Resumo", "Conteúdo", "Seção"]
-COLS_CLIENTE = ["Data", "Cliente", "Palavra-chave", "Portaria", "Link", "Resumo", "Conteúdo", "Alinhamento", "Justificativa", "Seção"]
+def _chave_gravacao(chave: tuple) -> str:
+    """Chave de gravação (coluna Chave) a partir da chave de dedupe da linha."""
+    return hashlib.sha256("\x1f".join(chave).encode("utf-8")).hexdigest()[:16]
 
 
 def _ws_gid(ws) -> str:
@@ -773,224 +1039,954 @@ def _ws_gid(ws) -> str:
         return ""
 
 
-# Erros transitórios do Google Sheets. A raspagem do DOU já tem retry próprio,
-# mas as chamadas ao Sheets não tinham: em 28/07/2026 um 500 na leitura da base
-# derrubou o run inteiro com o DOU já raspado, e em 23/07 foi um 429 de cota.
-_GS_TRANSITORIO_LEITURA = {429, 500, 502, 503, 504}
-# Em escrita só repetimos o que com certeza não chegou a ser aplicado: 429 é
-# recusa por cota e 503 é indisponibilidade, ambos antes de gravar. Um 500 pode
-# ter gravado antes de falhar, e repetir duplicaria linhas (a deduplicação aqui
-# é feita na leitura, não na gravação), então ele sobe e o run falha alto.
-_GS_TRANSITORIO_ESCRITA = {429, 503}
-
-
-def _gs_codigo(erro) -> int | None:
-    """Código HTTP de um erro do gspread, por qualquer um dos caminhos."""
-    resposta = getattr(erro, "response", None)
-    codigo = getattr(resposta, "status_code", None)
-    if isinstance(codigo, int):
-        return codigo
-    codigo = getattr(erro, "code", None)
-    if isinstance(codigo, int):
-        return codigo
-    m = re.search(r"\[(\d{3})\]", str(erro))
-    return int(m.group(1)) if m else None
-
-
-def _gs_retry(descricao: str, fn, *args, _escrita: bool = False, **kwargs):
-    """Repete uma chamada ao Sheets em erro transitório: 10s, 20s, 40s."""
-    repetiveis = _GS_TRANSITORIO_ESCRITA if _escrita else _GS_TRANSITORIO_LEITURA
-    ultimo = None
-    for tentativa in range(4):
-        try:
-            return fn(*args, **kwargs)
-        except gspread.exceptions.APIError as e:
-            codigo = _gs_codigo(e)
-            if codigo not in repetiveis:
-                raise
-            ultimo = e
-            if tentativa == 3:
-                break
-            espera = 10 * (2 ** tentativa)
-            print(f"[sheets] {descricao}: erro {codigo}, tentativa "
-                  f"{tentativa + 1}/4 falhou. Aguardando {espera}s...")
-            time.sleep(espera)
-    print(f"[sheets] {descricao}: falhou após 4 tentativas.")
-    raise ultimo
-
-
-def _fix_header(ws, all_vals: list[list], header: list[str]) -> None:
-    """Corrige cabeçalho usando dados já lidos em memória — zero chamadas extras à API."""
-    current = all_vals[0] if all_vals else []
-    if current == header:
+def _fix_header(ws, atual: list, header: list[str]) -> None:
+    """Corrige o cabeçalho a partir da linha 1 já lida — nenhuma leitura extra."""
+    if atual == header:
         return
-    ws.resize(rows=max(2, ws.row_count), cols=len(header))
-    _gs_retry("corrigir cabeçalho", ws.update, "1:1", [header], _escrita=True)
-    # atualiza all_vals in-place para refletir o novo header
-    if all_vals:
-        all_vals[0] = header
-    else:
-        all_vals.insert(0, header)
+    gs_retry("ajustar colunas", ws.resize, rows=max(2, ws.row_count), cols=len(header), _cota="escrita")
+    gs_retry("corrigir cabeçalho", ws.update, "1:1", [header], _escrita=True)
+    if COL_CHAVE not in atual:
+        _oculta_chave(ws, header)
 
 
-def salva_na_base(palavras_raspadas: dict | None) -> tuple[int, list, object | None, object | None]:
-    if not palavras_raspadas:
-        print("Sem resultados gerais para salvar.")
-        return 0, [], None, None
+def _oculta_chave(ws, header: list[str]) -> None:
+    if COL_CHAVE in header:
+        i = header.index(COL_CHAVE)
+        gs_retry(f"ocultar coluna {COL_CHAVE}", ws.hide_columns, i, i + 1, _cota="escrita")
+
+
+def _faixas_chave(header: list[str], colunas: list[str]) -> list[str]:
+    """Faixas A1 da linha de cabeçalho e de cada coluna da chave de dedupe."""
+    faixas = ["1:1"]
+    for col in colunas:
+        letra = col_letra(header.index(col))
+        faixas.append(f"{letra}2:{letra}")
+    return faixas
+
+
+def _chaves_de_colunas(colunas: list[list[list]]) -> set[tuple]:
+    """Junta colunas lidas em separado nas tuplas de chave, linha a linha.
+
+    A API omite as linhas vazias no fim de cada faixa, então as colunas podem
+    vir com tamanhos diferentes; o que falta conta como célula vazia. Linha sem
+    a primeira coluna da chave (o Link) não entra, como antes.
+    """
+    valores = [[(linha[0].strip() if linha else "") for linha in col] for col in colunas]
+    n = max(map(len, valores), default=0)
+    chaves: set[tuple] = set()
+    for j in range(n):
+        chave = tuple(col[j] if j < len(col) else "" for col in valores)
+        if chave[0]:
+            chaves.add(chave)
+    return chaves
+
+
+# Teto do corpo JSON de cada chamada de gravação de valores. A API recusa
+# pedidos perto de 10 MB, e em dia cheio um lote de 200 linhas com Conteúdo de
+# 49,5 mil caracteres passa disso.
+LOTE_MAX_BYTES = int(os.getenv("DOU_LOTE_MAX_BYTES", str(4 * 1024 * 1024)))
+
 
-    gc = _gs_client_from_env()
+def _fatias_por_tamanho(rows: list[list]) -> list[tuple[int, int, int]]:
+    """Divide rows em fatias (início, fim, bytes) de até LOTE_MAX_BYTES, na ordem.
+
+    O tamanho é o do JSON de cada linha; uma linha sozinha maior que o teto
+    vai numa fatia só dela.
+    """
+    fatias = []
+    ini, tam = 0, 0
+    for i, row in enumerate(rows):
+        t = len(json.dumps(row, ensure_ascii=False).encode("utf-8"))
+        if i > ini and tam + t > LOTE_MAX_BYTES:
+            fatias.append((ini, i, tam))
+            ini, tam = i, 0
+        tam += t
+    if ini < len(rows):
+        fatias.append((ini, len(rows), tam))
+    return fatias
+
+
+def _linhas_abertas(sh, blocos: list[tuple[object, list[list]]], chave_idx: int) -> bool:
+    """True se as faixas que _insere_no_topo grava podem receber os valores sem inserir de novo.
+
+    Confere, em cada aba, as linhas 2 a len(rows)+1: cada uma tem de estar
+    vazia ou já trazer na coluna Chave a chave da linha que vai nela (parte dos
+    valores gravada antes do erro). Faixa toda vazia também aparece numa aba
+    nova ou vazia em que o insert não aplicou; aí gravar nela dá o mesmo
+    resultado, desde que a grade tenha as linhas, o que se confere no fim.
+    """
+    from gspread.utils import absolute_range_name
+
+    resp = gs_retry("conferir linhas abertas", sh.values_batch_get, [
+        absolute_range_name(ws.title, f"A2:{col_letra(max(map(len, rows)) - 1)}{1 + len(rows)}")
+        for ws, rows in blocos
+    ])
+    lidas = [vr.get("values", []) for vr in resp.get("valueRanges", [])]
+    lidas += [[]] * (len(blocos) - len(lidas))
+    vazias = []
+    for (ws, rows), linhas in zip(blocos, lidas):
+        preenchidas = 0
+        for row, esperada in zip(linhas, rows):
+            if not any(str(c).strip() for c in row):
+                continue
+            if chave_idx >= len(row) or row[chave_idx] != esperada[chave_idx]:
+                return False
+            preenchidas += 1
+        if not preenchidas:
+            vazias.append((ws, rows))
+    if not vazias:
+        return True
+    meta = gs_retry("ler tamanho das abas", sh.fetch_sheet_metadata, params={
+        "fields": "sheets(properties(sheetId,gridProperties(rowCount)))",
+    })
+    grade = {
+        p["properties"]["sheetId"]: p["properties"].get("gridProperties", {}).get("rowCount", 0)
+        for p in meta.get("sheets", [])
+    }
+    return all(grade.get(ws.id, 0) >= 1 + len(rows) for ws, rows in vazias)
+
+
+def _insere_no_topo(sh, blocos: list[tuple[object, list[list]]], descricao: str, abertas: bool = False) -> None:
+    """Insere linhas na linha 2 de várias abas, com os valores em partes.
+
+    Um spreadsheets.batchUpdate abre todas as linhas de todas as abas (o mesmo
+    insertDimension do insert_rows; o pedido é pequeno). Depois, values.batchUpdate
+    USER_ENTERED preenche as faixas, em chamadas de até LOTE_MAX_BYTES. Cada
+    parte vai para uma faixa fixa, então a ordem das linhas se mantém. Os
+    valores não vão dentro do batchUpdate porque lá não há USER_ENTERED, e as
+    datas deixariam de virar data.
+
+    Com abertas=True as linhas já foram abertas (erro incerto numa tentativa
+    anterior, conferido com _linhas_abertas) e só os valores são gravados.
+    """
+    from gspread.utils import absolute_range_name
+
+    if not abertas:
+        # O batchUpdate é atômico: ou abre as linhas em todas as abas ou em
+        # nenhuma. Erro incerto sobe para _GravacaoEmLotes._grava, que confere.
+        gs_retry(f"inserir linhas ({descricao})", sh.batch_update, {
+            "requests": [
+                {"insertDimension": {
+                    "range": {"sheetId": ws.id, "dimension": "ROWS", "startIndex": 1, "endIndex": 1 + len(rows)},
+                    "inheritFromBefore": False,
+                }}
+                for ws, rows in blocos
+            ],
+        }, _escrita=True)
+
+    # faixas (range, linhas, bytes) agrupadas em chamadas de até LOTE_MAX_BYTES
+    chamadas: list[list] = []  # [bytes, [faixa, ...]]
+    for ws, rows in blocos:
+        ultima_col = col_letra(max(map(len, rows)) - 1)
+        for ini, fim, tam in _fatias_por_tamanho(rows):
+            faixa = {
+                "range": absolute_range_name(ws.title, f"A{2 + ini}:{ultima_col}{1 + fim}"),
+                "values": rows[ini:fim],
+            }
+            if not chamadas or chamadas[-1][0] + tam > LOTE_MAX_BYTES:
+                chamadas.append([0, []])
+            chamadas[-1][0] += tam
+            chamadas[-1][1].append(faixa)
+
+    for n, (tam, faixas) in enumerate(chamadas, start=1):
+        # Escrever em faixas fixas é idempotente: repetir depois de um 500 só
+        # regrava as mesmas células, então aqui vale o retry de leitura.
+        gs_retry(f"gravar valores ({descricao})", sh.values_batch_update, {
+            "valueInputOption": "USER_ENTERED",
+            "data": faixas,
+        }, _cota="escrita")
+        if len(chamadas) > 1:
+            linhas = sum(len(f["values"]) for f in faixas)
+            print(f"[sheets] {descricao}: parte {n}/{len(chamadas)} gravada "
+                  f"({linhas} linhas, {tam / 1024 / 1024:.1f} MB).")
+
+
+# Com DOU_MODO_ESCRITA=append as linhas vão para o fim da aba (values.append)
+# em vez de abrir espaço na linha 2. O insert no topo faz o Sheets deslocar a
+# aba inteira e fica mais lento conforme ela cresce; o append custa o mesmo
+# sempre. A leitura "mais recentes primeiro" passa a ser a vista de filtro
+# VISTA_RECENTES, ordenada por Data (comando vistas).
+MODO_ESCRITA = os.getenv("DOU_MODO_ESCRITA", "topo").strip().lower()
+VISTA_RECENTES = "Mais recentes"
+
+
+def _grava_linhas(sh, blocos: list[tuple[object, list[list]]], descricao: str, abertas: bool = False) -> None:
+    if MODO_ESCRITA != "append":
+        _insere_no_topo(sh, blocos, descricao, abertas=abertas)
+        return
+    # values.append não tem versão em lote; é uma chamada por aba, ou mais de
+    # uma se as linhas passarem de LOTE_MAX_BYTES. Anexar em ordem mantém a ordem.
+    for ws, rows in blocos:
+        fatias = _fatias_por_tamanho(rows)
+        for n, (ini, fim, tam) in enumerate(fatias, start=1):
+            gs_retry(f"anexar linhas em {ws.title}", ws.append_rows, rows[ini:fim],
+                      value_input_option="USER_ENTERED", insert_data_option="INSERT_ROWS",
+                      table_range="A1", _escrita=True)
+            if len(fatias) > 1:
+                print(f"[{ws.title}] parte {n}/{len(fatias)} anexada ({fim - ini} linhas, {tam / 1024 / 1024:.1f} MB).")
+
+
+def garante_vistas(sh, titulos: list[str], coluna_data: int) -> None:
+    """Cria a vista VISTA_RECENTES (Data decrescente) nas abas que não a têm."""
+    meta = gs_retry("ler vistas", sh.fetch_sheet_metadata, params={
+        "fields": "sheets(properties(sheetId,title),filterViews(title))",
+    })
+    pedidos = []
+    for aba in meta.get("sheets", []):
+        props = aba.get("properties", {})
+        if props.get("title") not in titulos:
+            continue
+        if any(v.get("title") == VISTA_RECENTES for v in aba.get("filterViews", [])):
+            continue
+        pedidos.append({"addFilterView": {"filter": {
+            "title": VISTA_RECENTES,
+            "range": {"sheetId": props["sheetId"]},
+            "sortSpecs": [{"dimensionIndex": coluna_data, "sortOrder": "DESCENDING"}],
+        }}})
+    if pedidos:
+        gs_retry("criar vistas", sh.batch_update, {"requests": pedidos}, _escrita=True)
+    print(f"Vista '{VISTA_RECENTES}': {len(pedidos)} criada(s).")
+
+
+# Linhas pendentes antes de ir ao Sheets. A raspagem corre em fluxo e só as
+# linhas ainda não gravadas ficam em memória, então o pico não cresce com o
+# tamanho da edição.
+LOTE_ESCRITA = int(os.getenv("DOU_LOTE_ESCRITA", "200"))
+
+# Dedupe por janela. Sem o índice local, em vez das colunas de chave da aba
+# inteira, lê do topo em páginas crescentes (DOU_DEDUPE_PAGINA linhas, depois o
+# dobro, ...) até uma página inteira ser DOU_DEDUPE_JANELA_DIAS dias mais velha
+# que a data mais antiga do lote. Só no modo topo, em que as linhas novas ficam
+# no alto; 0 volta a ler a aba inteira. Com o índice a leitura é uma
+# reconciliação e continua completa.
+# A Data não é monótona a partir do topo: um backfill põe linhas velhas acima
+# de linhas recentes. Por isso a parada olha a página toda, e não a última
+# linha; um backfill maior que uma página ainda pode esconder linhas da
+# janela, e a rodada seguinte a ele deve usar DOU_DEDUPE_JANELA_DIAS=0.
+DEDUPE_JANELA_DIAS = int(os.getenv("DOU_DEDUPE_JANELA_DIAS", "7"))
+DEDUPE_PAGINA = int(os.getenv("DOU_DEDUPE_PAGINA", "200"))
+
+ABA_GERAL = os.getenv("DOU_ABA_GERAL", "Página1")
+
+# Com DOU_GERAL_AGREGADO=1 a base geral recebe uma linha por publicação, com as
+# palavras-chave juntas ("a; b"), como nas abas de clientes. Sem isso cada
+# palavra casada repete a linha inteira, Conteúdo incluído. Na agregada a
+# dedupe é só pelo Link: palavras novas para um ato já gravado entram na linha
+# dele. O comando migra_geral copia o histórico de ABA_GERAL já agregado para
+# ABA_GERAL_AGREGADA; depois basta apontar DOU_ABA_GERAL para ela.
+GERAL_AGREGADO = os.getenv("DOU_GERAL_AGREGADO", "").strip().lower() in {"1", "true", "sim"}
+ABA_GERAL_AGREGADA = os.getenv("DOU_ABA_GERAL_AGREGADA", "Geral agregada")
+
+# Arquivo anual (comando arquiva): linhas com Data mais antiga que
+# DOU_ARQUIVO_DIAS saem da aba e vão para "<aba> <ano>", na própria planilha ou
+# em PLANILHA_ARQUIVO. As chaves das abas de arquivo continuam valendo na dedupe.
+ARQUIVO_DIAS = int(os.getenv("DOU_ARQUIVO_DIAS", "180"))
+PLANILHA_ARQUIVO = os.getenv("PLANILHA_ARQUIVO", "").strip()
+ARQUIVO_ABA_RX = re.compile(r"^(?P<aba>.+) (?P<ano>\d{4})$")
+
+
+def _abre_planilha_geral():
     planilha_id = os.getenv("PLANILHA")
     if not planilha_id:
         raise RuntimeError("Env PLANILHA não definido.")
+    return abre_planilha(planilha_id, "planilha geral")
 
-    sh = _gs_retry("abrir planilha geral", gc.open_by_key, planilha_id)
-    try:
-        ws = _gs_retry("abrir aba geral", sh.worksheet, "Página1")
-    except gspread.WorksheetNotFound:
-        ws = sh.add_worksheet(title="Página1", rows="2000", cols=str(len(COLS_GERAL)))
-
-    # 1 leitura única — header + dados juntos
-    all_vals = _gs_retry("ler base geral", ws.get_all_values)
-    _fix_header(ws, all_vals, COLS_GERAL)
-
-    link_idx = COLS_GERAL.index("Link")
-    palavra_idx = COLS_GERAL.index("Palavra-chave")
-
-    existing: set[tuple] = set()
-    for row in all_vals[1:]:
-        if len(row) > link_idx:
-            existing.add((
-                row[link_idx].strip(),
-                row[palavra_idx].strip() if len(row) > palavra_idx else "",
-            ))
 
-    rows_to_insert = []
-    inserted_items = []
+def _abre_planilha_clientes():
+    return abre_planilha(os.getenv("PLANILHA_CLIENTES"), "planilha de clientes")
+
 
-    for palavra, lista in (palavras_raspadas or {}).items():
-        for item in lista:
-            href = (item.get("href", "") or "").strip()
-            key = (href, palavra)
-            if not href or key in existing:
+class _GravacaoEmLotes:
+    """Agrupa similares, deduplica e grava as linhas de uma planilha em lotes.
+
+    Nada vai ao Sheets antes do primeiro lote. Aí a planilha é aberta, as abas
+    listadas com um worksheets() e as chaves de dedupe de todas as abas com
+    linhas pendentes lidas num único values_batch_get, só com o cabeçalho e as
+    colunas da chave. Aba sem linha no dia não é lida. As linhas novas de todas
+    as abas vão juntas em _grava_linhas. Cada linha fica em
+    memória até o lote ser gravado; depois disso sobra só o item compacto do
+    e-mail e a chave de dedupe.
+
+    Com o índice local (DOU_INDICE_DB), aba reconciliada há pouco não é lida:
+    a dedupe consulta o índice, e cada linha gravada entra nele.
+    Sem ele, no modo topo, só o alto da aba é lido (_le_chaves_janela).
+
+    Cada linha leva na coluna Chave o hash da sua chave de dedupe. Se a
+    gravação falha com um erro que pode ter sido aplicado (500), essa coluna é
+    relida e só as linhas que faltam são reenviadas. Com DOU_DIARIO_ESCRITA o
+    lote é anotado antes do envio; lote que ficou aberto numa rodada que caiu
+    faz as abas dele serem relidas do Sheets na próxima.
+
+    Com mescla (a coluna Palavra-chave da base geral agregada), linha cuja
+    chave já está na aba não é descartada: os valores dela nessa coluna são
+    juntados aos da linha gravada (_mescla).
+
+    Só linha que vai ser gravada nesta rodada representa um grupo de
+    similares. Representante que já estava na aba devolve os similares dele
+    para entrarem sozinhos; similar de representante de um lote já gravado
+    entra na célula Similares dessa linha, também por _mescla.
+    """
+
+    def __init__(self, descricao: str, abre, header: list[str], colunas_chave: list[str],
+                 mescla: str | None = None):
+        self.descricao = descricao
+        self._abre = abre
+        self._header = header
+        self._colunas_chave = colunas_chave
+        self._faixas = _faixas_chave(header, colunas_chave)
+        self._sim_idx = header.index("Similares")
+        self._chave_idx = header.index(COL_CHAVE)
+        self._mescla_idx = header.index(mescla) if mescla else None
+        self._mesclados: dict[str, dict[tuple, set]] = {}  # aba -> chave -> valores já na planilha
+        self.sh = None
+        self._indice = None
+        self._diario = None
+        self._lotes_abertos: dict[str, set[str]] = {}  # do diário: lote -> abas ainda não relidas
+        self._arquivo = None  # (planilha, {aba: [abas de arquivo]})
+        self._planilha: dict[str, object] = {}  # título -> worksheet, de um worksheets()
+        self.abas: dict[str, object] = {}  # só as abas que receberam linhas
+        self._existentes: dict[str, set] = {}  # chaves já gravadas na planilha
+        self._vistos: dict[str, set] = {}  # chaves já vistas nesta rodada
+        self._pendentes: dict[str, list[tuple[tuple, list, dict]]] = {}
+        self._n_pendentes = 0
+        self._similares = _Similares()
+        # similares de representantes ainda pendentes, para voltarem a entrar
+        # se o representante já estiver na planilha: (aba, chave) -> [adiciona]
+        self._anexos: dict[tuple, list[tuple]] = {}
+        self._gravadas: set[tuple] = set()  # (aba, chave) gravadas nesta rodada
+        self._similares_novos: dict[str, dict[tuple, list[str]]] = {}  # para linhas já gravadas
+        self.inseridos: dict[str, list[dict]] = {}
+        self.total = 0
+
+    def adiciona(self, aba: str, grupo: str, chave: tuple, linha: list, item: dict, sig: int | None) -> None:
+        # Quase duplicata de um ato que vai virar linha nesta rodada, no mesmo
+        # grupo: não vira linha, só entra na lista de similares do representante.
+        # Se o lote dele ainda não foi gravado, vai junto na linha; se já foi, a
+        # célula Similares da linha gravada é completada no próximo descarrega.
+        rep = self._similares.representante((aba, grupo), sig)
+        if rep is not None:
+            chave_rep, item_rep = rep
+            item_rep["similares"].append(item["href"])
+            if (aba, chave_rep) in self._gravadas:
+                self._similares_novos.setdefault(aba, {}).setdefault(chave_rep, []).append(item["href"])
+            else:
+                self._anexos.setdefault((aba, chave_rep), []).append((aba, grupo, chave, linha, item, sig))
+            return
+
+        vistos = self._vistos.setdefault(aba, set())
+        if not item["href"] or chave in vistos:
+            return
+        vistos.add(chave)
+        item["similares"] = []
+        self._similares.registra((aba, grupo), sig, chave, item)
+
+        linha = linha + [""] * (len(self._header) - len(linha))
+        linha[self._chave_idx] = _chave_gravacao(chave)
+        self._pendentes.setdefault(aba, []).append((chave, linha, item))
+        self._n_pendentes += 1
+        if self._n_pendentes >= LOTE_ESCRITA:
+            self.descarrega()
+
+    def _le_chaves(self, abas: list[str], forca: bool = False) -> None:
+        """Lê, numa chamada só, as chaves das abas que ainda não foram lidas.
+
+        Abas confiáveis no índice local não são lidas; com forca, todas são, e
+        o índice é refeito a partir delas.
+        """
+        from gspread.utils import absolute_range_name
+
+        self._abre_planilha()
+        novas = [aba for aba in abas if forca or aba not in self.abas]
+        ler = []
+        for aba in novas:
+            ws = self._planilha.get(aba)
+            if ws is None:
+                ws = cria_aba(self.sh, aba, rows=2, cols=len(self._header))
+                ler.append(aba)  # aba nova ainda precisa do cabeçalho
+            elif (not forca and self._indice is not None and self._indice.confiavel(aba)
+                  and not any(aba in abas_lote for abas_lote in self._lotes_abertos.values())):
+                self._existentes[aba] = self._indice.chaves(aba)
+            else:
+                ler.append(aba)
+            self.abas[aba] = ws
+        if not ler:
+            return
+
+        limite = None if forca else self._limite_janela(ler)
+        if limite is not None:
+            self._le_chaves_janela(ler, limite)
+            self._conclui_lotes(ler)
+            return
+
+        ranges = []
+        for aba in ler:
+            ranges.extend(absolute_range_name(aba, faixa) for faixa in self._faixas)
+
+        # Abas de arquivo entram só com as colunas da chave, na mesma chamada
+        # quando ficam na mesma planilha.
+        sh_arq, por_aba = self._abas_arquivo()
+        ranges_arq = [
+            (aba, absolute_range_name(titulo, faixa))
+            for aba in ler for titulo in por_aba.get(aba, []) for faixa in self._faixas[1:]
+        ]
+        mesma = sh_arq is self.sh
+        if mesma:
+            ranges += [r for _aba, r in ranges_arq]
+
+        resp = gs_retry(f"ler chaves ({self.descricao})", self.sh.values_batch_get, ranges)
+        lidas = [vr.get("values", []) for vr in resp.get("valueRanges", [])]
+        lidas += [[]] * (len(ranges) - len(lidas))
+
+        k = len(self._faixas)
+        for j, aba in enumerate(ler):
+            bloco = lidas[j * k:(j + 1) * k]
+            _fix_header(self.abas[aba], bloco[0][0] if bloco[0] else [], self._header)
+            self._existentes[aba] = _chaves_de_colunas(bloco[1:])
+
+        if ranges_arq:
+            if mesma:
+                lidas_arq = lidas[len(ler) * k:]
+            else:
+                resp = gs_retry(f"ler chaves do arquivo ({self.descricao})", sh_arq.values_batch_get,
+                                 [r for _aba, r in ranges_arq])
+                lidas_arq = [vr.get("values", []) for vr in resp.get("valueRanges", [])]
+                lidas_arq += [[]] * (len(ranges_arq) - len(lidas_arq))
+            for n in range(0, len(ranges_arq), k - 1):
+                aba = ranges_arq[n][0]
+                self._existentes[aba] |= _chaves_de_colunas(lidas_arq[n:n + k - 1])
+
+        if self._indice is not None:
+            for aba in ler:
+                self._indice.substitui(aba, self._existentes[aba])
+        self._conclui_lotes(ler)
+
+    def _conclui_lotes(self, lidas: list[str]) -> None:
+        """Conclui no diário os lotes abertos cujas abas já foram todas relidas."""
+        for lote, abas_lote in list(self._lotes_abertos.items()):
+            abas_lote.difference_update(lidas)
+            if not abas_lote:
+                self._diario.conclui(lote)
+                del self._lotes_abertos[lote]
+
+    def _limite_janela(self, abas: list[str]):
+        """Data até onde a leitura por janela desce, ou None para ler a aba inteira."""
+        if DEDUPE_JANELA_DIAS <= 0 or MODO_ESCRITA == "append" or self._indice is not None:
+            return None
+        datas = [
+            _data_celula(item.get("date", ""))
+            for aba in abas for _chave, _linha, item in self._pendentes.get(aba, [])
+        ]
+        if not datas or None in datas:
+            return None
+        return min(datas) - timedelta(days=DEDUPE_JANELA_DIAS)
+
+    def _le_chaves_janela(self, abas: list[str], limite) -> None:
+        """Lê as chaves do topo das abas, em páginas crescentes, até uma página toda passar de limite.
+
+        Uma values_batch_get por página, com todas as abas que ainda não
+        chegaram ao limite nem ao fim. As abas de arquivo não entram: o que
+        está nelas é mais velho que qualquer janela.
+        """
+        from gspread.utils import absolute_range_name
+
+        data_idx = self._header.index("Data")
+        cols = sorted({data_idx} | {self._header.index(c) for c in self._colunas_chave})
+        lidas_por_aba = {aba: [[] for _ in cols] for aba in abas}
+        inicio, tamanho, primeira = 2, DEDUPE_PAGINA, True
+        abertas = list(abas)
+        while abertas:
+            ranges = []
+            for aba in abertas:
+                if primeira:
+                    ranges.append(absolute_range_name(aba, "1:1"))
+                for c in cols:
+                    letra = col_letra(c)
+                    ranges.append(absolute_range_name(aba, f"{letra}{inicio}:{letra}{inicio + tamanho - 1}"))
+            resp = gs_retry(f"ler chaves do topo ({self.descricao})", self.sh.values_batch_get, ranges)
+            lidas = [vr.get("values", []) for vr in resp.get("valueRanges", [])]
+            lidas += [[]] * (len(ranges) - len(lidas))
+
+            k = len(cols) + primeira
+            seguem = []
+            for j, aba in enumerate(abertas):
+                bloco = lidas[j * k:(j + 1) * k]
+                if primeira:
+                    _fix_header(self.abas[aba], bloco[0][0] if bloco[0] else [], self._header)
+                    bloco = bloco[1:]
+                n = max(map(len, bloco), default=0)
+                for acumulado, col in zip(lidas_por_aba[aba], bloco):
+                    acumulado.extend(col + [[]] * (n - len(col)))
+                datas = [_data_celula(linha[0]) for linha in bloco[cols.index(data_idx)] if linha]
+                datas = [d for d in datas if d]
+                # Para só quando a página inteira é mais velha que o limite.
+                if n == tamanho and not (datas and max(datas) < limite):
+                    seguem.append(aba)
+            inicio, tamanho, primeira = inicio + tamanho, tamanho * 2, False
+            abertas = seguem
+
+        for aba in abas:
+            colunas = lidas_por_aba[aba]
+            self._existentes[aba] = _chaves_de_colunas(
+                [colunas[cols.index(self._header.index(c))] for c in self._colunas_chave]
+            )
+            print(f"[{aba}] dedupe por janela: {len(colunas[0])} linha(s) lidas do topo.")
+
+    def _abre_planilha(self) -> None:
+        if self.sh is None:
+            self.sh = self._abre()
+            self._indice = abre_indice(self.descricao, self.sh.id)
+            self._diario = abre_diario(self.descricao, self.sh.id)
+            if self._diario is not None:
+                self._lotes_abertos = self._diario.pendentes()
+                if self._lotes_abertos:
+                    print(f"[{self.descricao}] {len(self._lotes_abertos)} lote(s) sem conclusão no diário; "
+                          "as abas deles serão relidas.")
+            self._planilha = lista_abas(self.sh)
+
+    def _abas_arquivo(self) -> tuple[object, dict[str, list[str]]]:
+        """Planilha de arquivo e, para cada aba, os títulos das abas anuais dela."""
+        if self._arquivo is None:
+            if PLANILHA_ARQUIVO:
+                sh = abre_planilha(PLANILHA_ARQUIVO, "planilha de arquivo")
+                titulos = list(lista_abas(sh))
+            else:
+                sh, titulos = self.sh, list(self._planilha)
+            por_aba: dict[str, list[str]] = {}
+            for titulo in titulos:
+                m = ARQUIVO_ABA_RX.match(titulo)
+                if m:
+                    por_aba.setdefault(m.group("aba"), []).append(titulo)
+            self._arquivo = (sh, por_aba)
+        return self._arquivo
+
+    def descarrega(self) -> None:
+        abas = [aba for aba, pendentes in self._pendentes.items() if pendentes]
+        if abas:
+            self._le_chaves(abas)
+
+        gravar, mesclar, voltam = [], {}, []
+        for aba in abas:
+            existentes = self._existentes[aba]
+            chaves, rows, itens = [], [], []
+            for chave, linha, item in self._pendentes[aba]:
+                if chave in existentes:
+                    if self._mescla_idx is not None:
+                        mesclar.setdefault(aba, {}).setdefault(chave, set()).update(
+                            _separa_palavras(linha[self._mescla_idx]))
+                    # Já estava na planilha: deixa de ser representante, e os
+                    # similares ligados a ele voltam a entrar por conta própria.
+                    self._similares.remove(aba, chave)
+                    voltam += self._anexos.pop((aba, chave), [])
+                    continue
+                linha[self._sim_idx] = "\n".join(item["similares"])
+                chaves.append(chave)
+                rows.append(linha)
+                itens.append(item)
+            if rows:
+                gravar.append((aba, chaves, rows, itens))
+
+        if gravar:
+            lote = None
+            if self._diario is not None:
+                lote = self._diario.registra({
+                    aba: [row[self._chave_idx] for row in rows] for aba, _c, rows, _i in gravar
+                })
+            self._grava([(self.abas[aba], rows) for aba, _c, rows, _i in gravar])
+        for aba, chaves, rows, itens in gravar:
+            if self._indice is not None:
+                self._indice.registra(aba, chaves)
+            for chave in chaves:
+                self._anexos.pop((aba, chave), None)
+                self._gravadas.add((aba, chave))
+            print(f"[{aba}] +{len(rows)} linhas.")
+            self.inseridos.setdefault(aba, []).extend(itens)
+            self.total += len(rows)
+        if gravar and lote is not None:
+            self._diario.conclui(lote)
+        for aba, novos in mesclar.items():
+            self._mescla(aba, self._mescla_idx, novos, _separa_palavras, _junta_palavras)
+        similares_novos, self._similares_novos = self._similares_novos, {}
+        for aba, novos in similares_novos.items():
+            self._mescla(aba, self._sim_idx, novos, _separa_similares, "\n".join)
+        self._pendentes = {}
+        self._n_pendentes = 0
+
+        if voltam:
+            for args in voltam:
+                self.adiciona(*args)
+            self.descarrega()
+
+    def _mescla(self, aba: str, col: int, novos: dict[tuple, object], separa, junta) -> None:
+        """Junta novos[chave] à coluna col da linha já gravada com essa chave.
+
+        Serve à coluna de mescla (Palavra-chave na base agregada) e a Similares.
+        Lê a chave e a coluna da aba (uma vez por rodada basta para saber se há
+        algo novo; a releitura só acontece quando há) e grava só as células que
+        mudam, numa values_batch_update. Chave que só existe nas abas de arquivo
+        fica como está.
+        """
+        from gspread.utils import absolute_range_name
+
+        conhecidos = self._mesclados.get((aba, col))
+        if conhecidos is not None:
+            novos = {c: v for c, v in novos.items() if not set(v) <= set(conhecidos.get(c, v))}
+        if not novos:
+            return
+
+        cols = [self._header.index(c) for c in self._colunas_chave] + [col]
+        ranges = [absolute_range_name(aba, f"{col_letra(c)}2:{col_letra(c)}") for c in cols]
+        resp = gs_retry(f"ler {self._header[col]} ({aba})", self.sh.values_batch_get, ranges)
+        lidas = [vr.get("values", []) for vr in resp.get("valueRanges", [])]
+        lidas += [[]] * (len(ranges) - len(lidas))
+
+        def cel(coluna: list, j: int) -> str:
+            return coluna[j][0].strip() if j < len(coluna) and coluna[j] else ""
+
+        atuais: dict[tuple, tuple[int, list]] = {}
+        for j in range(max(map(len, lidas), default=0)):
+            chave = tuple(cel(coluna, j) for coluna in lidas[:-1])
+            if chave[0] and chave not in atuais:
+                atuais[chave] = (j + 2, separa(cel(lidas[-1], j)))
+        conhecidos = self._mesclados[(aba, col)] = {c: v for c, (_n, v) in atuais.items()}
+
+        letra = col_letra(col)
+        dados = []
+        for chave, valores in novos.items():
+            if chave not in atuais or set(valores) <= set(atuais[chave][1]):
                 continue
-            rows_to_insert.append([
-                item.get("date", ""),
-                palavra,
-                item.get("title", ""),
-                href,
-                item.get("abstract", ""),
-                item.get("content_page", ""),
-                item.get("secao", ""),
-            ])
-            inserted_items.append({
-                "date": item.get("date", ""),
-                "secao": item.get("secao", ""),
-                "keyword": palavra,
-                "title": item.get("title", ""),
-                "href": href,
-                "abstract": item.get("abstract", ""),
-            })
-            existing.add(key)
-
-    if rows_to_insert:
-        _gs_retry("gravar linhas na base geral", ws.insert_rows, rows_to_insert,
-                  row=2, value_input_option="USER_ENTERED", _escrita=True)
-        print(f"{len(rows_to_insert)} linhas adicionadas (geral).")
-    else:
-        print("Nenhuma linha nova (geral).")
+            linha, atual = atuais[chave]
+            conhecidos[chave] = atual + [v for v in dict.fromkeys(valores) if v not in atual]
+            dados.append({"range": absolute_range_name(aba, f"{letra}{linha}"),
+                          "values": [[junta(conhecidos[chave])]]})
+        if dados:
+            # Células fixas, então repetir é seguro.
+            gs_retry(f"juntar {self._header[col]} ({aba})", self.sh.values_batch_update,
+                     {"valueInputOption": "USER_ENTERED", "data": dados}, _cota="escrita")
+            print(f"[{aba}] {len(dados)} linha(s) já gravada(s) com {self._header[col]} nova.")
+
+    def _grava(self, blocos: list[tuple[object, list[list]]]) -> None:
+        """_grava_linhas, reenviando só o que faltou depois de um erro incerto."""
+        import gspread
+
+        abertas = False
+        for tentativa in range(3):
+            try:
+                _grava_linhas(self.sh, blocos, self.descricao, abertas=abertas)
+                return
+            except gspread.exceptions.APIError as e:
+                codigo = gs_codigo(e)
+                if codigo not in GS_ESCRITA_INCERTA or tentativa == 2:
+                    raise
+                # No modo topo o erro pode ter vindo depois do insert: as linhas
+                # abertas ficam no topo e só falta regravar os valores nelas.
+                # Inserir de novo deixaria essas linhas em branco na aba.
+                abertas = MODO_ESCRITA != "append" and _linhas_abertas(self.sh, blocos, self._chave_idx)
+                if abertas:
+                    print(f"[sheets] gravar ({self.descricao}): erro {codigo}, mas as linhas já estão "
+                          f"abertas; regravando só os valores.")
+                    continue
+                print(f"[sheets] gravar ({self.descricao}): erro {codigo}; "
+                      f"relendo a coluna {COL_CHAVE} para reenviar só o que faltou.")
+                blocos = self._faltantes(blocos)
+                if not blocos:
+                    return
+
+    def _faltantes(self, blocos: list[tuple[object, list[list]]]) -> list[tuple[object, list[list]]]:
+        """As linhas de blocos cuja Chave ainda não está na aba."""
+        from gspread.utils import absolute_range_name
+
+        col = col_letra(self._chave_idx)
+        resp = gs_retry(f"reler chaves de gravação ({self.descricao})", self.sh.values_batch_get,
+                        [absolute_range_name(ws.title, f"{col}2:{col}") for ws, _rows in blocos])
+        valores = [vr.get("values", []) for vr in resp.get("valueRanges", [])]
+        valores += [[]] * (len(blocos) - len(valores))
+        restantes = []
+        for (ws, rows), lidas in zip(blocos, valores):
+            gravadas = {r[0] for r in lidas if r}
+            faltam = [row for row in rows if row[self._chave_idx] not in gravadas]
+            print(f"[{ws.title}] {len(rows) - len(faltam)} de {len(rows)} linha(s) já estavam gravadas.")
+            if faltam:
+                restantes.append((ws, faltam))
+        return restantes
+
+    def reconcilia(self, abas: list[str]) -> None:
+        """Relê as chaves das abas no Sheets e refaz o índice local delas."""
+        self._le_chaves(abas, forca=True)
+        self._fecha_estado()
+        print(f"Índice reconciliado ({self.descricao}): {len(abas)} aba(s).")
+
+    def _fecha_estado(self) -> None:
+        if self._indice is not None:
+            self._indice.fecha()
+            self._indice = None
+        if self._diario is not None:
+            self._diario.fecha()
+            self._diario = None
+
+    def fecha(self) -> None:
+        self.descarrega()
+        self._fecha_estado()
+        if self.total:
+            print(f"{self.total} linhas adicionadas ({self.descricao}).")
+        else:
+            print(f"Nenhuma linha nova ({self.descricao}).")
 
-    return len(rows_to_insert), inserted_items, sh, ws
 
+def _gravacao_geral() -> _GravacaoEmLotes:
+    if GERAL_AGREGADO:
+        # Uma linha por Link: o mesmo ato casado com outras palavras numa rodada
+        # seguinte junta as palavras na linha existente em vez de repeti-la.
+        return _GravacaoEmLotes("geral_agregado", _abre_planilha_geral, COLS_GERAL, ["Link"],
+                                mescla="Palavra-chave")
+    return _GravacaoEmLotes("geral", _abre_planilha_geral, COLS_GERAL, ["Link", "Palavra-chave"])
 
-def salva_por_cliente(por_cliente: dict) -> tuple[int, dict, object | None, dict]:
-    plan_id = os.getenv("PLANILHA_CLIENTES")
-    if not plan_id:
+
+def _gravacao_clientes() -> _GravacaoEmLotes | None:
+    if not os.getenv("PLANILHA_CLIENTES"):
         print("PLANILHA_CLIENTES não definido; pulando saída por cliente.")
-        return 0, {}, None, {}
+        return None
+    return _GravacaoEmLotes("clientes", _abre_planilha_clientes, COLS_CLIENTE, ["Link", "Palavra-chave", "Cliente"])
+
+
+_ARMAZEM = None
+
+
+def _conteudo_para_planilha(link: str, texto: str) -> tuple[str, str]:
+    """(Conteúdo, Conteúdo ID) da linha: trecho e id com o armazém, texto inteiro sem ele."""
+    global _ARMAZEM
+    if not CONTEUDO_DB:
+        return texto, ""
+    if _ARMAZEM is None:
+        _ARMAZEM = abre_armazem()
+    return trecho(texto), _ARMAZEM.guarda(link, texto)
+
+
+def _assinatura_similares(texto: str) -> int | None:
+    return _simhash(texto) if SIMILARES_MAX_BITS > 0 else None
+
+
+def _junta_palavras(palavras) -> str:
+    return "; ".join(sorted(set(palavras), key=_normalize_ws))
+
 
-    gc = _gs_client_from_env()
-    sh = _gs_retry("abrir planilha de clientes", gc.open_by_key, plan_id)
+def _separa_palavras(celula: str) -> list[str]:
+    return [p.strip() for p in (celula or "").split(";") if p.strip()]
 
+
+def _separa_similares(celula: str) -> list[str]:
+    return [h.strip() for h in (celula or "").splitlines() if h.strip()]
+
+
+def _adiciona_geral(grav: _GravacaoEmLotes, palavra: str, item: dict, sig: int | None, grupo: str | None = None) -> None:
+    href = (item.get("href", "") or "").strip()
+    conteudo, conteudo_id = _conteudo_para_planilha(href, item.get("content_page", "") or "")
+    grav.adiciona(
+        ABA_GERAL,
+        palavra if grupo is None else grupo,
+        (href,) if GERAL_AGREGADO else (href, palavra),
+        [
+            item.get("date", ""),
+            palavra,
+            item.get("title", ""),
+            href,
+            item.get("abstract", ""),
+            conteudo,
+            item.get("secao", ""),
+            "",
+            conteudo_id,
+        ],
+        {
+            "date": item.get("date", ""),
+            "secao": item.get("secao", ""),
+            "keyword": palavra,
+            "title": item.get("title", ""),
+            "href": href,
+            "abstract": item.get("abstract", ""),
+        },
+        sig,
+    )
+
+
+def _adiciona_cliente(grav: _GravacaoEmLotes, cli: str, r: list, sig: int | None) -> None:
     link_idx = COLS_CLIENTE.index("Link")
-    kw_idx   = COLS_CLIENTE.index("Palavra-chave")
-    cli_idx  = COLS_CLIENTE.index("Cliente")
+    if len(r) <= link_idx:
+        return
+    href = (r[link_idx] or "").strip()
+    kw   = (r[COLS_CLIENTE.index("Palavra-chave")] or "").strip()
+    cli_ = (r[COLS_CLIENTE.index("Cliente")] or "").strip()
+    sec_idx = COLS_CLIENTE.index("Seção")
+    if CONTEUDO_DB:
+        r = r + [""] * (len(COLS_CLIENTE) - len(r))
+        cont_idx = COLS_CLIENTE.index("Conteúdo")
+        r[cont_idx], r[COLS_CLIENTE.index("Conteúdo ID")] = _conteudo_para_planilha(href, r[cont_idx])
+    grav.adiciona(
+        cli,
+        cli,
+        (href, kw, cli_),
+        r,
+        {
+            "date":     r[0],
+            "cliente":  cli_,
+            "keyword":  kw,
+            "title":    r[3],
+            "href":     href,
+            "abstract": r[5],
+            "secao":    r[sec_idx] if len(r) > sec_idx else "",
+        },
+        sig,
+    )
 
-    # -----------------------------------------------------------------------
-    # FASE 1 — garantir abas e ler TUDO de uma vez (1 leitura por cliente)
-    # -----------------------------------------------------------------------
-    ws_map:  dict[str, object]      = {}  # cli -> worksheet
-    gids:    dict[str, str]         = {}
-    cache:   dict[str, list[list]]  = {}  # cli -> all_vals já lidos
 
-    for cli in CLIENT_KEYWORDS:
-        try:
-            ws = _gs_retry(f"abrir aba {cli}", sh.worksheet, cli)
-        except gspread.WorksheetNotFound:
-            ws = sh.add_worksheet(title=cli, rows="2", cols=len(COLS_CLIENTE))
+def salva_na_base(palavras_raspadas: dict | None) -> tuple[int, list, object | None, object | None]:
+    if not palavras_raspadas:
+        print("Sem resultados gerais para salvar.")
+        return 0, [], None, None
 
-        # única leitura por cliente
-        all_vals = _gs_retry(f"ler aba {cli}", ws.get_all_values)
-        _fix_header(ws, all_vals, COLS_CLIENTE) # corrige header em memória + API se necessário
+    grav = _gravacao_geral()
+    if GERAL_AGREGADO:
+        por_href: dict[str, tuple[list, dict]] = {}
+        for palavra, lista in palavras_raspadas.items():
+            for item in lista:
+                por_href.setdefault(item.get("href", ""), ([], item))[0].append(palavra)
+        for palavras, item in por_href.values():
+            sig = _assinatura_similares(item.get("content_page") or "")
+            _adiciona_geral(grav, _junta_palavras(palavras), item, sig, grupo=ABA_GERAL)
+    else:
+        for palavra, lista in palavras_raspadas.items():
+            for item in lista:
+                sig = _assinatura_similares(item.get("content_page") or "")
+                _adiciona_geral(grav, palavra, item, sig)
+    grav.fecha()
 
-        ws_map[cli] = ws
-        gids[cli]   = _ws_gid(ws)
-        cache[cli]  = all_vals
+    return grav.total, grav.inseridos.get(ABA_GERAL, []), grav.sh, grav.abas.get(ABA_GERAL)
 
-    # -----------------------------------------------------------------------
-    # FASE 2 — deduplicar em memória e escrever (só escritas, zero leituras)
-    # -----------------------------------------------------------------------
-    total_new    = 0
-    inserted_map: dict[str, list] = {}
+
+def salva_por_cliente(por_cliente: dict) -> tuple[int, dict, object | None, dict]:
+    grav = _gravacao_clientes()
+    if grav is None:
+        return 0, {}, None, {}
 
     for cli, rows in (por_cliente or {}).items():
-        if not rows:
-            continue
+        for r in rows:
+            sig = _assinatura_similares(r[COLS_CLIENTE.index("Conteúdo")])
+            _adiciona_cliente(grav, cli, r, sig)
+    grav.fecha()
 
-        all_vals = cache.get(cli, [])
-        existing: set[tuple] = set()
-        for row in all_vals[1:]:
-            if len(row) > link_idx:
-                existing.add((
-                    row[link_idx].strip(),
-                    row[kw_idx].strip()  if len(row) > kw_idx  else "",
-                    row[cli_idx].strip() if len(row) > cli_idx else "",
-                ))
+    return grav.total, grav.inseridos, grav.sh, {cli: _ws_gid(ws) for cli, ws in grav.abas.items()}
 
-        new_rows:       list[list] = []
-        inserted_items: list[dict] = []
 
-        for r in rows:
-            if len(r) <= link_idx:
-                continue
-            href = (r[link_idx] or "").strip()
-            kw   = (r[kw_idx]   or "").strip()
-            cli_ = (r[cli_idx]  or "").strip()
-            key  = (href, kw, cli_)
-            if not href or key in existing:
-                continue
-            new_rows.append(r)
-            inserted_items.append({
-                "date":     r[0],
-                "cliente":  cli_,
-                "keyword":  kw,
-                "title":    r[3],
-                "href":     href,
-                "abstract": r[5],
-                "secao":    r[-1] if r else "",
-            })
-            existing.add(key)
-
-        if new_rows:
-            _gs_retry(f"gravar linhas de {cli}", ws_map[cli].insert_rows,
-                      new_rows, row=2, value_input_option="USER_ENTERED",
-                      _escrita=True)
-            print(f"[{cli}] +{len(new_rows)} linhas.")
-            total_new += len(new_rows)
-            inserted_map[cli] = inserted_items
+def _data_celula(valor: str):
+    for fmt in ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y"):
+        try:
+            return datetime.strptime((valor or "").strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _faixas_contiguas(indices: list[int]) -> list[tuple[int, int]]:
+    """[3, 4, 5, 9] -> [(3, 6), (9, 10)], índices de linha a partir de 0."""
+    faixas: list[list[int]] = []
+    for i in sorted(indices):
+        if faixas and faixas[-1][1] == i:
+            faixas[-1][1] = i + 1
         else:
-            print(f"[{cli}] nada novo.")
+            faixas.append([i, i + 1])
+    return [(ini, fim) for ini, fim in faixas]
+
 
-    return total_new, inserted_map, sh, gids
+def _arquiva_aba(sh, ws, sh_arq, header: list[str], colunas_chave: list[str], limite) -> int:
+    """Move as linhas anteriores a limite para as abas anuais de arquivo.
+
+    Primeiro grava no arquivo e só depois apaga da aba. Se a rodada cair no
+    meio, a próxima acha as linhas já arquivadas (pela chave) e não as repete.
+
+    Outro workflow pode inserir linhas no topo enquanto o arquivo é gravado,
+    e aí as posições lidas no começo já não valem. Logo antes de apagar, a
+    Data e a chave são relidas e as linhas a apagar, recalculadas por elas.
+    """
+    vals = gs_retry(f"ler {ws.title}", ws.get_all_values)
+    data_idx = header.index("Data")
+    chave_idx = [header.index(c) for c in colunas_chave]
+
+    def chave(row: list) -> tuple:
+        return tuple((row[j].strip() if j < len(row) else "") for j in chave_idx)
+
+    por_ano: dict[int, list[tuple[int, list]]] = {}
+    for i, row in enumerate(vals[1:], start=1):
+        d = _data_celula(row[data_idx] if len(row) > data_idx else "")
+        if d and d < limite:
+            por_ano.setdefault(d.year, []).append((i, row))
+    if not por_ano:
+        print(f"[{ws.title}] nada a arquivar.")
+        return 0
+
+    for ano, linhas in sorted(por_ano.items()):
+        titulo = f"{ws.title} {ano}"
+        arq = lista_abas(sh_arq).get(titulo)
+        if arq is None:
+            arq = cria_aba(sh_arq, titulo, rows=2, cols=len(header))
+        lidas = gs_retry(f"ler chaves de {titulo}", arq.batch_get, _faixas_chave(header, colunas_chave))
+        _fix_header(arq, lidas[0][0] if lidas[0] else [], header)
+        ja = _chaves_de_colunas(lidas[1:])
+
+        novas = [row for _i, row in linhas if chave(row) not in ja]
+        if novas:
+            gs_retry(f"arquivar em {titulo}", arq.append_rows, novas,
+                      value_input_option="USER_ENTERED", insert_data_option="INSERT_ROWS",
+                      table_range="A1", _escrita=True)
+        print(f"[{ws.title}] {len(novas)} linha(s) de {ano} arquivada(s) em '{titulo}'.")
+
+    indices = sorted(i for linhas in por_ano.values() for i, _row in linhas)
+    arquivadas = {chave(row) for linhas in por_ano.values() for _i, row in linhas}
+    cols = [data_idx] + chave_idx
+    lidas = gs_retry(f"reler {ws.title}", ws.batch_get, [f"{col_letra(c)}2:{col_letra(c)}" for c in cols])
+    lidas += [[]] * (len(cols) - len(lidas))
+    atuais = []
+    for j in range(max(map(len, lidas), default=0)):
+        row = [""] * len(header)
+        for c, col in zip(cols, lidas):
+            row[c] = col[j][0] if j < len(col) and col[j] else ""
+        d = _data_celula(row[data_idx])
+        if d and d < limite and chave(row) in arquivadas:
+            atuais.append(j + 1)  # índice a partir de 0, com o cabeçalho na 0
+    if atuais != indices:
+        print(f"[{ws.title}] a aba mudou durante o arquivamento; "
+              f"apagando {len(atuais)} linha(s) pelas posições relidas.")
+        indices = atuais
+    if not indices:
+        return 0
+    gs_retry(f"apagar linhas arquivadas de {ws.title}", sh.batch_update, {
+        "requests": [
+            {"deleteDimension": {"range": {
+                "sheetId": ws.id, "dimension": "ROWS", "startIndex": ini, "endIndex": fim,
+            }}}
+            # de baixo para cima, para os índices das faixas seguintes não mudarem
+            for ini, fim in reversed(_faixas_contiguas(indices))
+        ],
+    }, _escrita=True)
+    return len(indices)
+
+
+def arquiva_antigas():
+    """Move para o arquivo anual as linhas com mais de ARQUIVO_DIAS dias (comando arquiva)."""
+    limite = now_br().date() - timedelta(days=ARQUIVO_DIAS)
+    print(f"Arquivando linhas anteriores a {limite:%d/%m/%Y}.")
+
+    destinos = [(_gravacao_geral(), [ABA_GERAL])]
+    clientes = _gravacao_clientes()
+    if clientes is not None:
+        destinos.append((clientes, list(CLIENT_KEYWORDS)))
+
+    for grav, abas in destinos:
+        grav._abre_planilha()
+        sh_arq, _por_aba = grav._abas_arquivo()
+        total = 0
+        for aba in abas:
+            ws = grav._planilha.get(aba)
+            if ws is not None:
+                total += _arquiva_aba(grav.sh, ws, sh_arq, grav._header, grav._colunas_chave, limite)
+        print(f"{total} linha(s) arquivada(s) ({grav.descricao}).")
 
 
 # ---------------------------------------------------------------------------
@@ -1022,6 +2018,9 @@ def _brevo_client():
     api_key = os.getenv("BREVO_API_KEY")
     if not api_key:
         return None
+    from brevo_python import ApiClient, Configuration
+    from brevo_python.api.transactional_emails_api import TransactionalEmailsApi
+
     cfg = Configuration()
     cfg.api_key["api-key"] = api_key
     return TransactionalEmailsApi(ApiClient(configuration=cfg))
@@ -1077,6 +2076,20 @@ def _truncate(s: str, n: int = 260) -> str:
     return s[: n - 1].rstrip() + "…"
 
 
+def _similares_html(it: dict) -> str:
+    hrefs = [h for h in (it.get("similares") or []) if h]
+    if not hrefs:
+        return ""
+    links = ", ".join(
+        f"<a href='{html.escape(h)}' target='_blank' style='color:#6b7280;'>{i}</a>"
+        for i, h in enumerate(hrefs, 1)
+    )
+    return (
+        f"<div style='margin-top:4px; color:#6b7280; font-size:12px;'>"
+        f"+{len(hrefs)} ato(s) similar(es): {links}</div>"
+    )
+
+
 def _build_html_email_geral(
     inserted_geral: list[dict],
     planilha_id: str,
@@ -1090,7 +2103,12 @@ def _build_html_email_geral(
     total = len(inserted_geral)
     geral_url = _gs_tab_url(planilha_id, planilha_gid)
 
-    kw_counts = Counter((it.get("keyword") or "").strip() for it in inserted_geral if (it.get("keyword") or "").strip())
+    # Na base agregada o item traz as palavras juntas ("a; b"); no e-mail ele
+    # aparece em cada palavra, como quando era uma linha por palavra.
+    def _kws(it: dict) -> list[str]:
+        return [p.strip() for p in (it.get("keyword") or "").split(";") if p.strip()]
+
+    kw_counts = Counter(kw for it in inserted_geral for kw in _kws(it))
     sec_counts = Counter((it.get("secao") or "").strip() for it in inserted_geral if (it.get("secao") or "").strip())
 
     top_kw = kw_counts.most_common(8)
@@ -1098,8 +2116,8 @@ def _build_html_email_geral(
 
     by_kw: dict[str, list[dict]] = {}
     for it in inserted_geral:
-        kw = (it.get("keyword") or "—").strip() or "—"
-        by_kw.setdefault(kw, []).append(it)
+        for kw in _kws(it) or ["—"]:
+            by_kw.setdefault(kw, []).append(it)
 
     blocks = []
     for kw, items in sorted(by_kw.items(), key=lambda kv: len(kv[1]), reverse=True):
@@ -1115,6 +2133,7 @@ def _build_html_email_geral(
                 + f"<a href='{href}' target='_blank' style='color:#111; text-decoration:none;'><b>{title}</b></a>"
                 + f"{_badge(sec)}"
                 + (f"<div style='margin-top:4px; color:#374151; font-size:13px;'>{html.escape(abs_)}</div>" if abs_ else "")
+                + _similares_html(it)
                 + "</li>"
             )
         more = ""
@@ -1275,6 +2294,7 @@ def _build_html_email_clientes(
                     + f"<a href='{href}' target='_blank' style='color:#111; text-decoration:none;'><b>{title}</b></a>"
                     + f"{_badge(sec)}"
                     + (f"<div style='margin-top:4px; color:#374151; font-size:13px;'>{html.escape(abs_)}</div>" if abs_ else "")
+                    + _similares_html(it)
                     + "</li>"
                 )
             more = ""
@@ -1343,6 +2363,8 @@ def _send_email(subject: str, html_body: str, recipients: list[str]) -> None:
     if not (api and sender_email and recipients and html_body):
         print("Dados de e-mail incompletos ou HTML vazio; pulando envio.")
         return
+    from brevo_python.models.send_smtp_email import SendSmtpEmail
+    from brevo_python.rest import ApiException
 
     for dest in recipients:
         try:
@@ -1400,16 +2422,156 @@ def envia_emails_edicao(
 # Entrypoints
 # ---------------------------------------------------------------------------
 
-def executar_regular(data: str | None = None):
-    conteudo = raspa_dou(data=data)
+def processa_edicao(edicao: Edicao | None) -> tuple[list, dict, object | None]:
+    """Raspagem → casamento → gravação em fluxo, uma publicação por vez.
+
+    Cada publicação tem o corpo baixado uma vez, é casada com as palavras gerais
+    e com as dos clientes, e vira linhas nos buffers de gravação, que vão ao
+    Sheets a cada LOTE_ESCRITA linhas. O corpo não fica guardado depois disso.
+    """
+    if not edicao:
+        print("Nenhum conteúdo para analisar.")
+        return [], {}, None
+
+    geral = _gravacao_geral()
+    clientes = _gravacao_clientes()
+    vistos_cli: set[tuple] = set()
+
+    for r, conteudo_pagina in itera_publicacoes(edicao):
+        sig = _assinatura_similares(conteudo_pagina)
 
-    geral = procura_termos(conteudo)
-    _qtd_g, ins_g, _sh, ws_geral = salva_na_base(geral)
+        achados = list(casa_termos(r, conteudo_pagina))
+        if GERAL_AGREGADO and achados:
+            palavras = _junta_palavras(palavra for palavra, _item in achados)
+            _adiciona_geral(geral, palavras, achados[0][1], sig, grupo=ABA_GERAL)
+        else:
+            for palavra, item in achados:
+                _adiciona_geral(geral, palavra, item, sig)
+
+        if clientes is None:
+            continue
+        for cli, row in casa_termos_clientes(r, conteudo_pagina):
+            if (cli, r.link) in vistos_cli:
+                continue
+            vistos_cli.add((cli, r.link))
+            _adiciona_cliente(clientes, cli, row, sig)
+
+    geral.fecha()
+    if clientes is not None:
+        clientes.fecha()
+
+    return (
+        geral.inseridos.get(ABA_GERAL, []),
+        clientes.inseridos if clientes is not None else {},
+        geral.abas.get(ABA_GERAL),
+    )
 
-    por_cliente = procura_termos_clientes(conteudo)
-    _qtd_c, ins_c, _sh_c, _gids = salva_por_cliente(por_cliente)
 
+def migra_geral():
+    """Copia ABA_GERAL para ABA_GERAL_AGREGADA com uma linha por publicação (comando migra_geral).
+
+    Linhas do mesmo Link viram uma, com as palavras-chave juntas e os similares
+    somados; o resto vem da linha de Data mais recente (a primeira delas, no
+    empate). Pela Data e não pela posição, porque no modo append a mais
+    recente fica embaixo. A aba de origem não é alterada, e a de destino não
+    pode existir.
+    """
+    sh = _abre_planilha_geral()
+    if ABA_GERAL_AGREGADA in lista_abas(sh):
+        print(f"A aba '{ABA_GERAL_AGREGADA}' já existe; apague-a ou escolha outro DOU_ABA_GERAL_AGREGADA.")
+        return
+
+    ws = busca_aba(sh, ABA_GERAL)
+    vals = gs_retry(f"ler {ABA_GERAL}", ws.get_all_values)
+    if not vals:
+        print(f"'{ABA_GERAL}' vazia; nada a migrar.")
+        return
+    idx = {c: vals[0].index(c) for c in COLS_GERAL if c in vals[0]}
+
+    grupos: dict[str, dict] = {}
+    for row in vals[1:]:
+        def cel(col: str) -> str:
+            i = idx.get(col)
+            return row[i].strip() if i is not None and i < len(row) else ""
+
+        link = cel("Link")
+        if not link:
+            continue
+        data = _data_celula(cel("Data")) or date.min
+        g = grupos.get(link)
+        if g is None:
+            g = grupos[link] = {"linha": None, "data": None, "palavras": [], "similares": []}
+        if g["linha"] is None or data > g["data"]:
+            g["linha"], g["data"] = [cel(c) for c in COLS_GERAL], data
+        g["palavras"] += _separa_palavras(cel("Palavra-chave"))
+        for similar in cel("Similares").splitlines():
+            if similar.strip() and similar.strip() not in g["similares"]:
+                g["similares"].append(similar.strip())
+
+    pk_idx = COLS_GERAL.index("Palavra-chave")
+    sim_idx = COLS_GERAL.index("Similares")
+    chave_idx = COLS_GERAL.index(COL_CHAVE)
+    linhas = []
+    for link, g in grupos.items():
+        linha = g["linha"]
+        linha[pk_idx] = _junta_palavras(g["palavras"])
+        linha[sim_idx] = "\n".join(g["similares"])
+        linha[chave_idx] = _chave_gravacao((link,))
+        linhas.append(linha)
+
+    dest = cria_aba(sh, ABA_GERAL_AGREGADA, rows=len(linhas) + 1, cols=len(COLS_GERAL))
+    gs_retry("gravar cabeçalho", dest.update, "1:1", [COLS_GERAL], _escrita=True)
+    _oculta_chave(dest, COLS_GERAL)
+
+    # Em blocos de até LOTE_MAX_BYTES; faixa fixa, então repetir é seguro.
+    inicio = 0
+    while inicio < len(linhas):
+        fim, tam = inicio, 0
+        while fim < len(linhas):
+            t = len(json.dumps(linhas[fim], ensure_ascii=False).encode("utf-8"))
+            if fim > inicio and tam + t > LOTE_MAX_BYTES:
+                break
+            tam += t
+            fim += 1
+        gs_retry(f"gravar {ABA_GERAL_AGREGADA}", dest.update, f"A{inicio + 2}", linhas[inicio:fim],
+                  value_input_option="USER_ENTERED", _cota="escrita")
+        print(f"[{ABA_GERAL_AGREGADA}] {fim}/{len(linhas)} linhas.")
+        inicio = fim
+
+    print(f"{len(vals) - 1} linhas de '{ABA_GERAL}' viraram {len(linhas)} em '{ABA_GERAL_AGREGADA}'. "
+          f"Para usar: DOU_GERAL_AGREGADO=1 e DOU_ABA_GERAL={ABA_GERAL_AGREGADA}.")
+
+
+def cria_vistas():
+    """Cria a vista "mais recentes primeiro" nas abas geral e de clientes (comando vistas)."""
+    sh = _abre_planilha_geral()
+    garante_vistas(sh, [ABA_GERAL], COLS_GERAL.index("Data"))
+    if os.getenv("PLANILHA_CLIENTES"):
+        sh = _abre_planilha_clientes()
+        garante_vistas(sh, list(CLIENT_KEYWORDS), COLS_CLIENTE.index("Data"))
+
+
+def reconcilia_indices():
+    """Refaz o índice local de dedupe a partir das planilhas (comando reconcilia)."""
+    if not INDICE_DB:
+        print("DOU_INDICE_DB não definido; nada a reconciliar.")
+        return
+    _gravacao_geral().reconcilia([ABA_GERAL])
+    clientes = _gravacao_clientes()
+    if clientes is not None:
+        clientes.reconcilia(list(CLIENT_KEYWORDS))
+
+
+def executar_regular(data: str | None = None):
     hoje = data or now_br().strftime("%d-%m-%Y")
+    conteudo = raspa_dou(data=data)
+
+    abre_snapshot(conteudo, hoje)
+    try:
+        ins_g, ins_c, ws_geral = processa_edicao(conteudo)
+    finally:
+        fecha_snapshot()
+
     envia_emails_edicao(
         edicao_label="Edição Regular",
         subtitulo=f"Edição Regular — {hoje}",
@@ -1424,12 +2586,7 @@ def executar_regular(data: str | None = None):
 
 def executar_extra(data: str | None = None):
     conteudo = raspa_dou_extra(data=data)
-
-    geral = procura_termos(conteudo)
-    _qtd_g, ins_g, _sh, ws_geral = salva_na_base(geral)
-
-    por_cliente = procura_termos_clientes(conteudo)
-    _qtd_c, ins_c, _sh_c, _gids = salva_por_cliente(por_cliente)
+    ins_g, ins_c, ws_geral = processa_edicao(conteudo)
 
     data_label = data or now_br().strftime("%d-%m-%Y")
     hora = now_br().strftime("%H:%M")
@@ -1457,13 +2614,24 @@ if __name__ == "__main__":
     # Backfill de um dia específico (formato dd-mm-aaaa). Vazio = hoje.
     data_env = os.getenv("DOU_DATE", "").strip() or None
 
-    if modo == "regular":
-        executar_regular(data=data_env)
-    elif modo == "extra":
-        executar_extra(data=data_env)
-    elif modo == "extra_retroativo":
-        executar_extra()
-        ontem = (now_br() - timedelta(days=1)).strftime("%d-%m-%Y")
-        executar_extra(data=ontem)
-    else:
-        executar_tudo()
+    try:
+        if modo == "regular":
+            executar_regular(data=data_env)
+        elif modo == "extra":
+            executar_extra(data=data_env)
+        elif modo == "reconcilia":
+            reconcilia_indices()
+        elif modo == "vistas":
+            cria_vistas()
+        elif modo == "arquiva":
+            arquiva_antigas()
+        elif modo == "migra_geral":
+            migra_geral()
+        elif modo == "extra_retroativo":
+            executar_extra()
+            ontem = (now_br() - timedelta(days=1)).strftime("%d-%m-%Y")
+            executar_extra(data=ontem)
+        else:
+            executar_tudo()
+    finally:
+        grava_perfil()
@@ -0,0 +1,358 @@
+"""Estado local entre rodadas do DOU (SQLite).
+
+Índice de dedupe: as chaves de cada linha gravada no Sheets, uma tabela por
+destino (geral, geral_agregado, clientes, cargos). Com ele a rodada não precisa reler as abas
+antes de gravar. Cada aba guarda a planilha e a hora da última reconciliação.
+Aba nunca reconciliada, de outra planilha ou reconciliada há mais de
+DOU_INDICE_RECONCILIA_DIAS dias volta a ser lida do Sheets, e essa leitura
+substitui as chaves dela no índice. Isso pega linhas apagadas ou coladas à mão.
+
+Sem DOU_INDICE_DB nada disso é usado e a dedupe lê o Sheets como antes.
+
+Diário de gravações: com DOU_DIARIO_ESCRITA cada lote é anotado (abas e
+chaves de gravação) antes de ir ao Sheets e marcado quando termina. Um lote
+que ficou aberto, porque a rodada caiu no meio da gravação, faz as abas dele
+serem relidas do Sheets na próxima rodada, em vez de confiar no índice.
+
+Cópias das abas: com DOU_CACHE_ABAS o alinhamento guarda aqui o conteúdo de
+cada aba de cliente depois de passar por ela, e na passada seguinte só relê
+do Sheets as abas que mudaram (ou só as linhas novas delas).
+
+Classificações: com DOU_CACHE_ALINHAMENTO o alinhamento guarda cada resposta
+do Gemini pela chave (cliente, hash do conteúdo, hash do prompt, modelo). A
+mesma linha reclassificada (Alinhamento apagado, aba restaurada, ato
+republicado) sai daqui sem chamar o modelo, e mudar o prompt, a descrição do
+cliente ou o modelo muda a chave.
+
+Armazém de conteúdo: com DOU_CONTEUDO_DB o texto integral de cada matéria fica
+aqui, comprimido com zlib e identificado pelo hash do texto. A planilha recebe
+só um trecho e esse id, na coluna "Conteúdo ID", e quem precisa do texto
+(o alinhamento) o busca pelo id.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+INDICE_DB = os.getenv("DOU_INDICE_DB", "").strip()
+RECONCILIA_DIAS = float(os.getenv("DOU_INDICE_RECONCILIA_DIAS", "7"))
+
+DIARIO_ESCRITA = os.getenv("DOU_DIARIO_ESCRITA", "").strip()
+CACHE_ABAS = os.getenv("DOU_CACHE_ABAS", "").strip()
+CACHE_ALINHAMENTO = os.getenv("DOU_CACHE_ALINHAMENTO", "").strip()
+
+CONTEUDO_DB = os.getenv("DOU_CONTEUDO_DB", "").strip()
+TRECHO_MAX = int(os.getenv("DOU_CONTEUDO_TRECHO", "1000"))  # o que ainda vai para a célula Conteúdo
+
+DESTINOS = ("geral", "geral_agregado", "clientes", "cargos")
+
+# separador dos campos da chave; não aparece em link, palavra-chave nem cliente
+_SEP = "\x1f"
+
+
+def _conecta(caminho: str) -> sqlite3.Connection:
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    con = sqlite3.connect(caminho)
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS abas ("
+        " destino TEXT, aba TEXT, planilha TEXT, reconciliado_em REAL,"
+        " PRIMARY KEY (destino, aba))"
+    )
+    for destino in DESTINOS:
+        con.execute(
+            f"CREATE TABLE IF NOT EXISTS chaves_{destino} ("
+            " aba TEXT, chave TEXT, PRIMARY KEY (aba, chave)) WITHOUT ROWID"
+        )
+    return con
+
+
+class _ChavesAba:
+    """Consulta de pertinência no índice, sem carregar as chaves da aba."""
+
+    __slots__ = ("_con", "_sql", "_aba")
+
+    def __init__(self, con: sqlite3.Connection, destino: str, aba: str):
+        self._con = con
+        self._sql = f"SELECT 1 FROM chaves_{destino} WHERE aba = ? AND chave = ?"
+        self._aba = aba
+
+    def __contains__(self, chave: tuple) -> bool:
+        return self._con.execute(self._sql, (self._aba, _SEP.join(chave))).fetchone() is not None
+
+
+class IndiceDedupe:
+    """Chaves já gravadas num destino (uma planilha), por aba."""
+
+    def __init__(self, caminho: str, destino: str, planilha: str):
+        if destino not in DESTINOS:
+            raise ValueError(f"destino desconhecido: {destino}")
+        self.destino = destino
+        self.planilha = planilha
+        self._con = _conecta(caminho)
+
+    def confiavel(self, aba: str) -> bool:
+        """True se a aba foi reconciliada com esta planilha há pouco tempo."""
+        row = self._con.execute(
+            "SELECT planilha, reconciliado_em FROM abas WHERE destino = ? AND aba = ?",
+            (self.destino, aba),
+        ).fetchone()
+        if row is None or row[0] != self.planilha:
+            return False
+        return time.time() - row[1] < RECONCILIA_DIAS * 86400
+
+    def chaves(self, aba: str) -> _ChavesAba:
+        return _ChavesAba(self._con, self.destino, aba)
+
+    def registra(self, aba: str, chaves) -> None:
+        """Acrescenta as chaves de linhas que acabaram de ser gravadas."""
+        with self._con:
+            self._con.executemany(
+                f"INSERT OR IGNORE INTO chaves_{self.destino} (aba, chave) VALUES (?, ?)",
+                ((aba, _SEP.join(c)) for c in chaves),
+            )
+
+    def substitui(self, aba: str, chaves) -> None:
+        """Troca as chaves da aba pelas lidas do Sheets e marca a reconciliação."""
+        with self._con:
+            self._con.execute(f"DELETE FROM chaves_{self.destino} WHERE aba = ?", (aba,))
+            self._con.executemany(
+                f"INSERT OR IGNORE INTO chaves_{self.destino} (aba, chave) VALUES (?, ?)",
+                ((aba, _SEP.join(c)) for c in chaves),
+            )
+            self._con.execute(
+                "INSERT OR REPLACE INTO abas (destino, aba, planilha, reconciliado_em) VALUES (?, ?, ?, ?)",
+                (self.destino, aba, self.planilha, time.time()),
+            )
+
+    def fecha(self) -> None:
+        self._con.close()
+
+
+def abre_indice(destino: str, planilha: str) -> IndiceDedupe | None:
+    """Índice do destino, ou None sem DOU_INDICE_DB."""
+    if not INDICE_DB or not planilha:
+        return None
+    return IndiceDedupe(INDICE_DB, destino, planilha)
+
+
+# Um lock para todas as instâncias do processo: o geral e o de clientes têm
+# cada um o seu diário no mesmo arquivo, e a compactação de um não pode correr
+# junto com a escrita do outro.
+_DIARIO_LOCK = threading.Lock()
+
+
+def _le_diario(caminho: str) -> dict[str, dict]:
+    """Lotes abertos no arquivo (de todos os destinos): lote -> registro."""
+    abertos: dict[str, dict] = {}
+    if not os.path.exists(caminho):
+        return abertos
+    with open(caminho, encoding="utf-8") as f:
+        for linha in f:
+            try:
+                reg = json.loads(linha)
+            except ValueError:
+                continue  # última linha cortada por uma queda
+            if "fim" in reg:
+                abertos.pop(reg["lote"], None)
+            else:
+                abertos[reg["lote"]] = reg
+    return abertos
+
+
+class DiarioEscrita:
+    """Lotes de gravação de um destino, em JSONL: um registro ao abrir, outro ao concluir.
+
+    Várias instâncias podem usar o mesmo arquivo. Cada registro abre o arquivo
+    em modo append (não há handle guardado que fique apontando para um arquivo
+    já substituído) e a compactação de fecha() relê o que está no disco.
+    """
+
+    def __init__(self, caminho: str, destino: str, planilha: str):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self.caminho = caminho
+        self.destino = destino
+        self.planilha = planilha
+        with _DIARIO_LOCK:
+            self._abertos = _le_diario(caminho)
+
+    def _escreve(self, reg: dict) -> None:
+        with _DIARIO_LOCK, open(self.caminho, "a", encoding="utf-8") as f:
+            f.write(json.dumps(reg, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def pendentes(self) -> dict[str, set[str]]:
+        """Lotes deste destino e planilha que não chegaram ao fim: lote -> abas."""
+        return {
+            lote: set(reg["abas"]) for lote, reg in self._abertos.items()
+            if reg.get("destino") == self.destino and reg.get("planilha") == self.planilha
+        }
+
+    def registra(self, abas: dict[str, list[str]]) -> str:
+        """Anota um lote (aba -> chaves de gravação) antes de enviá-lo."""
+        lote = f"{time.time_ns():x}"
+        reg = {"lote": lote, "destino": self.destino, "planilha": self.planilha,
+               "em": time.time(), "abas": abas}
+        self._escreve(reg)
+        self._abertos[lote] = reg
+        return lote
+
+    def conclui(self, lote: str) -> None:
+        self._escreve({"lote": lote, "fim": time.time()})
+        self._abertos.pop(lote, None)
+
+    def fecha(self) -> None:
+        """Reescreve o arquivo só com os lotes ainda abertos, de qualquer instância."""
+        with _DIARIO_LOCK:
+            abertos = _le_diario(self.caminho)
+            tmp = self.caminho + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for reg in abertos.values():
+                    f.write(json.dumps(reg, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.caminho)
+
+
+def abre_diario(destino: str, planilha: str) -> DiarioEscrita | None:
+    """Diário de gravações do destino, ou None sem DOU_DIARIO_ESCRITA."""
+    if not DIARIO_ESCRITA or not planilha:
+        return None
+    return DiarioEscrita(DIARIO_ESCRITA, destino, planilha)
+
+
+class CacheAbas:
+    """Última cópia de cada aba (valores, comprimidos) e a versão da planilha no Drive."""
+
+    def __init__(self, caminho: str):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._con = sqlite3.connect(caminho)
+        self._con.execute("CREATE TABLE IF NOT EXISTS planilhas (planilha TEXT PRIMARY KEY, versao TEXT)")
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS copias ("
+            " planilha TEXT, aba TEXT, gravado_em REAL, dados BLOB,"
+            " PRIMARY KEY (planilha, aba))"
+        )
+
+    def versao(self, planilha: str) -> str | None:
+        row = self._con.execute("SELECT versao FROM planilhas WHERE planilha = ?", (planilha,)).fetchone()
+        return row[0] if row else None
+
+    def marca_versao(self, planilha: str, versao: str | None) -> None:
+        with self._con:
+            self._con.execute("INSERT OR REPLACE INTO planilhas (planilha, versao) VALUES (?, ?)",
+                              (planilha, versao))
+
+    def le(self, planilha: str, aba: str) -> list[list[str]] | None:
+        row = self._con.execute(
+            "SELECT dados FROM copias WHERE planilha = ? AND aba = ?", (planilha, aba),
+        ).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def guarda(self, planilha: str, aba: str, valores: list[list[str]]) -> None:
+        dados = zlib.compress(json.dumps(valores, ensure_ascii=False).encode("utf-8"), 6)
+        with self._con:
+            self._con.execute(
+                "INSERT OR REPLACE INTO copias (planilha, aba, gravado_em, dados) VALUES (?, ?, ?, ?)",
+                (planilha, aba, time.time(), dados),
+            )
+
+    def esquece(self, planilha: str, aba: str) -> None:
+        with self._con:
+            self._con.execute("DELETE FROM copias WHERE planilha = ? AND aba = ?", (planilha, aba))
+
+    def fecha(self) -> None:
+        self._con.close()
+
+
+def abre_cache_abas() -> CacheAbas | None:
+    """Cache de cópias das abas, ou None sem DOU_CACHE_ABAS."""
+    return CacheAbas(CACHE_ABAS) if CACHE_ABAS else None
+
+
+class CacheAlinhamento:
+    """Classificações do Gemini por (cliente, hash do conteúdo, hash do prompt, modelo)."""
+
+    def __init__(self, caminho: str):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._con = sqlite3.connect(caminho)
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS classificacoes ("
+            " cliente TEXT, conteudo TEXT, prompt TEXT, modelo TEXT,"
+            " alinhamento TEXT, justificativa TEXT, gravado_em REAL,"
+            " PRIMARY KEY (cliente, conteudo, prompt, modelo))"
+        )
+
+    def le(self, chave: tuple) -> dict | None:
+        row = self._con.execute(
+            "SELECT alinhamento, justificativa FROM classificacoes"
+            " WHERE cliente = ? AND conteudo = ? AND prompt = ? AND modelo = ?", chave,
+        ).fetchone()
+        return {"alinhamento": row[0], "justificativa": row[1]} if row else None
+
+    def guarda(self, chave: tuple, res: dict) -> None:
+        with self._con:
+            self._con.execute(
+                "INSERT OR REPLACE INTO classificacoes (cliente, conteudo, prompt, modelo,"
+                " alinhamento, justificativa, gravado_em) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*chave, res["alinhamento"], res["justificativa"], time.time()),
+            )
+
+    def fecha(self) -> None:
+        self._con.close()
+
+
+def abre_cache_alinhamento() -> CacheAlinhamento | None:
+    """Cache de classificações, ou None sem DOU_CACHE_ALINHAMENTO."""
+    return CacheAlinhamento(CACHE_ALINHAMENTO) if CACHE_ALINHAMENTO else None
+
+
+class ArmazemConteudo:
+    """Textos integrais das matérias, comprimidos, pelo hash do texto."""
+
+    def __init__(self, caminho: str):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._con = sqlite3.connect(caminho)
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS conteudos ("
+            " id TEXT PRIMARY KEY, link TEXT, gravado_em REAL, dados BLOB)"
+        )
+
+    def guarda(self, link: str, texto: str) -> str:
+        """Guarda o texto (se ainda não estiver lá) e devolve o id."""
+        dados = (texto or "").encode("utf-8")
+        cid = hashlib.sha256(dados).hexdigest()[:16]
+        with self._con:
+            self._con.execute(
+                "INSERT OR IGNORE INTO conteudos (id, link, gravado_em, dados) VALUES (?, ?, ?, ?)",
+                (cid, link, time.time(), zlib.compress(dados, 6)),
+            )
+        return cid
+
+    def le(self, cid: str) -> str | None:
+        row = self._con.execute("SELECT dados FROM conteudos WHERE id = ?", (cid,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def fecha(self) -> None:
+        self._con.close()
+
+
+def abre_armazem() -> ArmazemConteudo | None:
+    """Armazém de conteúdo, ou None sem DOU_CONTEUDO_DB."""
+    return ArmazemConteudo(CONTEUDO_DB) if CONTEUDO_DB else None
+
+
+def trecho(texto: str) -> str:
+    texto = texto or ""
+    return texto if len(texto) <= TRECHO_MAX else texto[:TRECHO_MAX] + "…"
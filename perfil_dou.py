@@ -0,0 +1,58 @@
+"""Perfil opcional das regras de busca, comum ao dou_unificado e ao cargos_dou.
+
+Com DOU_PERFIL=caminho.csv (ou .json), cada busca de regra de exclusão,
+âncora da Seção 3, palavra-chave e filtro de cargo conta chamadas, acertos e
+tempo, e grava_perfil() grava o relatório ordenado por tempo no fim do run.
+Serve para achar regra que nunca dispara e padrão que custa caro.
+
+Desligado (PERFIL_ATIVO falso), os laços quentes fazem o pat.search direto e
+não chamam busca_perfilada nem montam rótulo: o custo é um teste por laço.
+"""
+import csv
+import json
+import os
+import time
+
+PERFIL_ARQUIVO = os.getenv("DOU_PERFIL", "").strip()
+PERFIL_ATIVO = bool(PERFIL_ARQUIVO)
+_PERFIL: dict[tuple[str, str], list] = {}
+
+
+def busca_perfilada(grupo: str, regra: str, pat, texto: str):
+    """pat.search(texto), contado no perfil sob (grupo, regra) se ele estiver ligado."""
+    if not PERFIL_ATIVO:
+        return pat.search(texto)
+    ini = time.perf_counter()
+    m = pat.search(texto)
+    reg = _PERFIL.setdefault((grupo, regra), [0, 0, 0.0])
+    reg[0] += 1
+    reg[1] += m is not None
+    reg[2] += time.perf_counter() - ini
+    return m
+
+
+def grava_perfil(caminho: str = PERFIL_ARQUIVO) -> None:
+    if not PERFIL_ATIVO or not caminho:
+        return
+    linhas = [
+        {
+            "grupo": grupo,
+            "regra": regra,
+            "chamadas": chamadas,
+            "acertos": acertos,
+            "segundos": round(segundos, 6),
+            "us_por_chamada": round(segundos / chamadas * 1e6, 2) if chamadas else 0,
+        }
+        for (grupo, regra), (chamadas, acertos, segundos) in _PERFIL.items()
+    ]
+    linhas.sort(key=lambda l: l["segundos"], reverse=True)
+
+    if caminho.lower().endswith(".json"):
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(linhas, f, ensure_ascii=False, indent=2)
+    else:
+        with open(caminho, "w", encoding="utf-8", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=["grupo", "regra", "chamadas", "acertos", "segundos", "us_por_chamada"])
+            w.writeheader()
+            w.writerows(linhas)
+    print(f"[perfil] {len(linhas)} regras gravadas em {caminho}")
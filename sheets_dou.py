@@ -0,0 +1,265 @@
+"""Acesso ao Google Sheets comum aos scripts do DOU.
+
+gs_retry é a porta de toda chamada à API. Antes de cada tentativa ela passa
+pela cota local: um balde de fichas de leitura e outro de escrita, enchidos a
+DOU_SHEETS_LEITURAS_MIN e DOU_SHEETS_ESCRITAS_MIN por minuto, com até
+DOU_SHEETS_RAJADA fichas guardadas. Sem ficha, a chamada espera a próxima em
+vez de tomar um 429 e dormir 10, 20, 40 s.
+
+A sessão também fica aqui: cliente() autentica uma vez por processo,
+abre_planilha() guarda cada Spreadsheet aberto e lista_abas() guarda as abas de
+cada planilha, vindas de um único worksheets() (uma fetch_sheet_metadata com
+título, gid e tamanho de todas). As abas criadas com cria_aba() entram nesse
+cache; nenhum script precisa de um sh.worksheet(titulo) por aba.
+
+O Google conta a cota por minuto e por usuário, e o usuário é a mesma conta
+de serviço nos três scripts. Com DOU_SHEETS_COTA os baldes ficam nesse arquivo
+(trancado com flock), então a raspagem e o alinhamento rodando em sequência,
+ou dois processos ao mesmo tempo, dividem a mesma cota. Sem ele cada processo
+tem a sua.
+"""
+import json
+import os
+import re
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava, cada processo confia no próprio relógio
+    fcntl = None
+
+COTA_ARQUIVO = os.getenv("DOU_SHEETS_COTA", "").strip()
+# A cota padrão é 60 por minuto por usuário. Taxa + rajada <= 60 mantém
+# qualquer janela de um minuto dentro dela.
+COTA_POR_MINUTO = {
+    "leitura": float(os.getenv("DOU_SHEETS_LEITURAS_MIN", "50")),
+    "escrita": float(os.getenv("DOU_SHEETS_ESCRITAS_MIN", "50")),
+}
+COTA_RAJADA = float(os.getenv("DOU_SHEETS_RAJADA", "10"))
+
+
+class Cota:
+    """Baldes de fichas de leitura e escrita, em memória ou num arquivo."""
+
+    def __init__(self, caminho: str = "", por_minuto: dict | None = None, rajada: float = COTA_RAJADA):
+        self.caminho = caminho
+        self.por_minuto = por_minuto or COTA_POR_MINUTO
+        self.rajada = rajada
+        self._estado: dict = {}
+        if caminho and os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+
+    def _atualiza(self, fn):
+        """Aplica fn ao estado dos baldes, com o arquivo trancado se houver um."""
+        if not self.caminho:
+            return fn(self._estado)
+        fd = os.open(self.caminho, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            with os.fdopen(os.dup(fd), "r+", encoding="utf-8") as f:
+                try:
+                    estado = json.load(f)
+                except ValueError:
+                    estado = {}
+                ret = fn(estado)
+                f.seek(0)
+                f.truncate()
+                json.dump(estado, f)
+            return ret
+        finally:
+            os.close(fd)  # solta o flock
+
+    def _fichas(self, estado: dict, tipo: str, agora: float) -> float:
+        fichas, em = estado.get(tipo, (self.rajada, agora))
+        taxa = self.por_minuto[tipo] / 60
+        return min(self.rajada, fichas + max(0.0, agora - em) * taxa)
+
+    def consome(self, tipo: str, n: int = 1) -> float:
+        """Reserva n fichas e espera até elas existirem. Devolve a espera em s."""
+        taxa = self.por_minuto[tipo] / 60
+        if taxa <= 0:
+            return 0.0
+
+        def _reserva(estado):
+            agora = time.time()
+            # Fica negativo quando há fila: a espera de cada um já conta a dos anteriores.
+            fichas = self._fichas(estado, tipo, agora) - n
+            estado[tipo] = (fichas, agora)
+            return -fichas / taxa if fichas < 0 else 0.0
+
+        espera = self._atualiza(_reserva)
+        if espera > 0:
+            time.sleep(espera)
+        return espera
+
+    def esgota(self, tipo: str) -> None:
+        """Zera o balde depois de um 429: a cota do Google acabou antes da nossa."""
+        def _zera(estado):
+            agora = time.time()
+            estado[tipo] = (min(0.0, self._fichas(estado, tipo, agora)), agora)
+
+        self._atualiza(_zera)
+
+
+COTA = Cota(COTA_ARQUIVO)
+
+
+# Erros transitórios do Google Sheets. A raspagem do DOU já tem retry próprio,
+# mas as chamadas ao Sheets não tinham: em 28/07/2026 um 500 na leitura da base
+# derrubou o run inteiro com o DOU já raspado, e em 23/07 foi um 429 de cota.
+_GS_TRANSITORIO_LEITURA = {429, 500, 502, 503, 504}
+# Em escrita só repetimos o que com certeza não chegou a ser aplicado: 429 é
+# recusa por cota e 503 é indisponibilidade, ambos antes de gravar. Um 500 pode
+# ter gravado antes de falhar, e repetir às cegas duplicaria linhas, então ele
+# sobe para quem chamou: a gravação em lotes do dou_unificado relê a coluna
+# Chave e reenvia só as linhas que não chegaram.
+_GS_TRANSITORIO_ESCRITA = {429, 503}
+# Erros de escrita em que não dá para saber se o pedido foi aplicado.
+GS_ESCRITA_INCERTA = {500, 502, 504}
+
+
+def gs_codigo(erro) -> int | None:
+    """Código HTTP de um erro do gspread, por qualquer um dos caminhos."""
+    resposta = getattr(erro, "response", None)
+    codigo = getattr(resposta, "status_code", None)
+    if isinstance(codigo, int):
+        return codigo
+    codigo = getattr(erro, "code", None)
+    if isinstance(codigo, int):
+        return codigo
+    m = re.search(r"\[(\d{3})\]", str(erro))
+    return int(m.group(1)) if m else None
+
+
+def gs_retry(descricao: str, fn, *args, _escrita: bool = False, _cota: str | None = None,
+             _chamadas: int = 1, **kwargs):
+    """Chama o Sheets dentro da cota e repete em erro transitório: 10s, 20s, 40s.
+
+    _escrita: gravação não idempotente; só repete 429 e 503.
+    _cota: balde a consumir ("leitura" ou "escrita"); por padrão, escrita se
+    _escrita. Gravação em faixa fixa passa _cota="escrita" sem _escrita.
+    _chamadas: quantas requisições fn faz (insert_rows, por exemplo, faz duas).
+    """
+    import gspread
+
+    cota = _cota or ("escrita" if _escrita else "leitura")
+    repetiveis = _GS_TRANSITORIO_ESCRITA if _escrita else _GS_TRANSITORIO_LEITURA
+    ultimo = None
+    for tentativa in range(4):
+        espera = COTA.consome(cota, _chamadas)
+        if espera >= 5:
+            print(f"[sheets] {descricao}: {espera:.0f}s de espera pela cota de {cota}.")
+        try:
+            return fn(*args, **kwargs)
+        except gspread.exceptions.APIError as e:
+            codigo = gs_codigo(e)
+            if codigo not in repetiveis:
+                raise
+            if codigo == 429:
+                COTA.esgota(cota)
+            ultimo = e
+            if tentativa == 3:
+                break
+            espera = 10 * (2 ** tentativa)
+            print(f"[sheets] {descricao}: erro {codigo}, tentativa "
+                  f"{tentativa + 1}/4 falhou. Aguardando {espera}s...")
+            time.sleep(espera)
+    print(f"[sheets] {descricao}: falhou após 4 tentativas.")
+    raise ultimo
+
+
+def col_letra(idx: int) -> str:
+    """Letra da coluna (A, B, ..., AA) para um índice a partir de 0."""
+    letras = ""
+    idx += 1
+    while idx:
+        idx, resto = divmod(idx - 1, 26)
+        letras = chr(ord("A") + resto) + letras
+    return letras
+
+
+# ---------------------------------------------------------------------------
+# Sessão
+# ---------------------------------------------------------------------------
+
+_CLIENTE = None
+_PLANILHAS: dict[str, object] = {}  # chave -> Spreadsheet
+_ABAS: dict[str, dict[str, object]] = {}  # chave -> {título: Worksheet}, na ordem da planilha
+
+
+def cliente():
+    """Cliente gspread do processo, autenticado na primeira chamada.
+
+    Credenciais de GOOGLE_APPLICATION_CREDENTIALS_JSON ou, sem ela, do
+    credentials.json da pasta.
+    """
+    global _CLIENTE
+    if _CLIENTE is None:
+        import gspread
+        from google.oauth2.service_account import Credentials
+
+        scopes = [
+            "https://www.googleapis.com/auth/spreadsheets",
+            "https://www.googleapis.com/auth/drive",
+        ]
+        raw = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
+        if raw:
+            info = json.loads(raw)
+            if "private_key" in info and "\\n" in info["private_key"]:
+                info["private_key"] = info["private_key"].replace("\\n", "\n")
+            creds = Credentials.from_service_account_info(info, scopes=scopes)
+        elif os.path.exists("credentials.json"):
+            creds = Credentials.from_service_account_file("credentials.json", scopes=scopes)
+        else:
+            raise RuntimeError("Secret GOOGLE_APPLICATION_CREDENTIALS_JSON não encontrado.")
+        _CLIENTE = gspread.authorize(creds)
+    return _CLIENTE
+
+
+def abre_planilha(chave: str, descricao: str = "planilha"):
+    """Spreadsheet da chave, aberto uma vez por processo."""
+    if chave not in _PLANILHAS:
+        _PLANILHAS[chave] = gs_retry(f"abrir {descricao}", cliente().open_by_key, chave)
+    return _PLANILHAS[chave]
+
+
+def lista_abas(sh) -> dict[str, object]:
+    """Abas da planilha por título, de um worksheets() só por processo."""
+    if sh.id not in _ABAS:
+        _ABAS[sh.id] = {ws.title: ws for ws in gs_retry(f"listar abas de {sh.title}", sh.worksheets)}
+    return _ABAS[sh.id]
+
+
+def busca_aba(sh, titulo: str):
+    """Aba pelo título, do cache de lista_abas(); WorksheetNotFound se não existir."""
+    import gspread
+
+    ws = lista_abas(sh).get(titulo)
+    if ws is None:
+        raise gspread.WorksheetNotFound(titulo)
+    return ws
+
+
+def cria_aba(sh, titulo: str, rows: int, cols: int):
+    """Cria a aba e a põe no cache de lista_abas()."""
+    ws = gs_retry(f"criar aba {titulo}", sh.add_worksheet, title=titulo, rows=rows, cols=cols, _escrita=True)
+    lista_abas(sh)[titulo] = ws
+    return ws
+
+
+def versao_drive(sh) -> str | None:
+    """Versão da planilha no Drive, que muda a cada alteração em qualquer aba.
+
+    None se o Drive não responder; quem usa cai na validação aba a aba.
+    """
+    import gspread
+
+    try:
+        resp = gs_retry("ler versão no Drive", cliente().http_client.request, "get",
+                        f"https://www.googleapis.com/drive/v3/files/{sh.id}",
+                        params={"fields": "version", "supportsAllDrives": "true"})
+        return str(resp.json().get("version") or "") or None
+    except gspread.exceptions.APIError as e:
+        print(f"[sheets] versão no Drive indisponível ({e}); validando aba a aba.")
+        return None
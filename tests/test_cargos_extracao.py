@@ -0,0 +1,28 @@
+import os
+
+os.environ.setdefault("PLANILHA_CARGOS", "teste")
+
+import cargos_dou  # noqa: E402
+
+
+def test_citacao_de_artigo_no_meio_da_frase_nao_corta_o_ato():
+    texto = (
+        "NOMEAR, nos termos do art. 9º, inciso I, da Lei nº 8.112, de 11 de dezembro de 1990, "
+        "MARIA DAS GRAÇAS SOUZA para exercer o cargo de Secretária-Executiva do Ministério da Saúde, "
+        "código CCE 1.18."
+    )
+    res = cargos_dou._extrai_clipping(texto)
+    assert res["Verbo"] == "NOMEAR"
+    assert res["Pessoa"] == "MARIA DAS GRAÇAS SOUZA"
+    assert res["Cargo"] == "Secretária-Executiva"
+    assert res["Órgão"] == "Ministério da Saúde"
+
+
+def test_artigo_no_inicio_do_paragrafo_separa_os_atos():
+    texto = (
+        "RESOLVE:\n"
+        "Art. 1º EXONERAR JOÃO DA SILVA do cargo de Secretário-Executivo do Ministério da Educação.\n"
+        "Art. 2º Esta portaria entra em vigor na data de sua publicação."
+    )
+    atos = cargos_dou._segmenta(texto)[0]["atos"]
+    assert atos[0]["fim"] == texto.index("Art. 2º")
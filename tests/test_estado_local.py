@@ -0,0 +1,31 @@
+from estado_local import DiarioEscrita
+
+
+def test_diario_compartilhado_mantem_lote_aberto_do_outro_destino(tmp_path):
+    caminho = str(tmp_path / "diario.jsonl")
+    geral = DiarioEscrita(caminho, "geral", "G")
+    clientes = DiarioEscrita(caminho, "clientes", "C")
+
+    lote_geral = geral.registra({"Página1": ["a"]})
+    geral.conclui(lote_geral)
+    geral.fecha()
+
+    # o de clientes anota o último lote depois da compactação do geral e a
+    # rodada cai antes do clientes.fecha()
+    lote = clientes.registra({"IEPS": ["b"]})
+
+    assert DiarioEscrita(caminho, "clientes", "C").pendentes() == {lote: {"IEPS"}}
+    assert DiarioEscrita(caminho, "geral", "G").pendentes() == {}
+
+
+def test_diario_fecha_nao_perde_lote_aberto_antes_por_outra_instancia(tmp_path):
+    caminho = str(tmp_path / "diario.jsonl")
+    geral = DiarioEscrita(caminho, "geral", "G")
+    clientes = DiarioEscrita(caminho, "clientes", "C")
+
+    lote = clientes.registra({"IEPS": ["b"]})
+    geral.fecha()
+    clientes.conclui(lote)
+    clientes.fecha()
+
+    assert DiarioEscrita(caminho, "clientes", "C").pendentes() == {}
@@ -0,0 +1,129 @@
+import re
+
+import pytest
+
+import dou_unificado as d
+import sheets_dou
+
+ABA = "Página1"
+
+
+def _col(letras: str) -> int:
+    n = 0
+    for c in letras:
+        n = n * 26 + ord(c) - 64
+    return n - 1
+
+
+class Aba:
+    def __init__(self, title, vals, id=1):
+        self.title, self.vals, self.id = title, vals, id
+        self.row_count, self.col_count = len(vals) + 1, len(d.COLS_GERAL)
+
+    def resize(self, rows=None, cols=None):
+        pass
+
+    def update(self, rng, vals, **kw):
+        self.vals[0] = list(vals[0])
+
+    def hide_columns(self, ini, fim):
+        pass
+
+
+class Planilha:
+    """O pouco da API do Sheets que _GravacaoEmLotes usa, em memória."""
+
+    def __init__(self, abas):
+        self.id = self.title = "G"
+        self.abas = {ws.title: ws for ws in abas}
+
+    def worksheets(self):
+        return list(self.abas.values())
+
+    def _aba(self, rng):
+        titulo, _, faixa = rng.rpartition("!")
+        return self.abas[titulo.strip("'")], faixa
+
+    def values_batch_get(self, ranges, params=None):
+        out = []
+        for rng in ranges:
+            ws, faixa = self._aba(rng)
+            m = re.fullmatch(r"(\d+):(\d+)", faixa)
+            if m:
+                linhas = [list(r) for r in ws.vals[int(m.group(1)) - 1:int(m.group(2))]]
+            else:
+                m = re.fullmatch(r"([A-Z]+)(\d+):([A-Z]+)(\d*)", faixa)
+                c0, c1 = _col(m.group(1)), _col(m.group(3)) + 1
+                fim = int(m.group(4)) if m.group(4) else None
+                linhas = [r[c0:c1] for r in ws.vals[int(m.group(2)) - 1:fim]]
+            out.append({"range": rng, "values": linhas} if any(linhas) else {"range": rng})
+        return {"valueRanges": out}
+
+    def batch_update(self, body):
+        por_id = {ws.id: ws for ws in self.abas.values()}
+        for req in body["requests"]:
+            r = req["insertDimension"]["range"]
+            por_id[r["sheetId"]].vals[r["startIndex"]:r["startIndex"]] = [
+                [] for _ in range(r["endIndex"] - r["startIndex"])
+            ]
+
+    def values_batch_update(self, body):
+        for dado in body["data"]:
+            ws, faixa = self._aba(dado["range"])
+            m = re.fullmatch(r"([A-Z]+)(\d+)(?::[A-Z]+\d+)?", faixa)
+            c0, r0 = _col(m.group(1)), int(m.group(2)) - 1
+            for k, valores in enumerate(dado["values"]):
+                linha = ws.vals[r0 + k]
+                linha.extend([""] * (c0 + len(valores) - len(linha)))
+                linha[c0:c0 + len(valores)] = valores
+
+
+@pytest.fixture(autouse=True)
+def _sem_estado(monkeypatch):
+    monkeypatch.setattr(d, "MODO_ESCRITA", "topo")
+    monkeypatch.setattr(d, "DEDUPE_JANELA_DIAS", 0)
+    monkeypatch.setattr(d, "abre_indice", lambda *a: None)
+    monkeypatch.setattr(d, "abre_diario", lambda *a: None)
+    monkeypatch.setattr(sheets_dou.time, "sleep", lambda s: None)
+    sheets_dou._ABAS.clear()
+
+
+def _linha(link):
+    linha = [""] * len(d.COLS_GERAL)
+    linha[d.COLS_GERAL.index("Palavra-chave")] = "kw"
+    linha[d.COLS_GERAL.index("Link")] = link
+    linha[d.COLS_GERAL.index(d.COL_CHAVE)] = d._chave_gravacao((link, "kw"))
+    return linha
+
+
+def _adiciona(grav, link):
+    item = {"href": link}
+    grav.adiciona(ABA, "kw", (link, "kw"), _linha(link)[:-1], item, 0)
+    return item
+
+
+def test_similar_de_ato_ja_gravado_em_rodada_anterior_vira_linha():
+    ws = Aba(ABA, [list(d.COLS_GERAL), _linha("a")])
+    grav = d._GravacaoEmLotes("geral", lambda: Planilha([ws]), d.COLS_GERAL, ["Link", "Palavra-chave"])
+
+    _adiciona(grav, "a")  # já estava na aba
+    _adiciona(grav, "b")  # quase duplicata de a, nova
+    grav.fecha()
+
+    links = [r[d.COLS_GERAL.index("Link")] for r in ws.vals[1:]]
+    assert links == ["b", "a"]
+    assert [it["href"] for it in grav.inseridos[ABA]] == ["b"]
+
+
+def test_similar_de_representante_de_lote_ja_gravado_entra_na_celula(monkeypatch):
+    monkeypatch.setattr(d, "LOTE_ESCRITA", 1)
+    ws = Aba(ABA, [list(d.COLS_GERAL)])
+    grav = d._GravacaoEmLotes("geral", lambda: Planilha([ws]), d.COLS_GERAL, ["Link", "Palavra-chave"])
+
+    item_a = _adiciona(grav, "a")  # vai sozinho no primeiro lote
+    _adiciona(grav, "b")
+    grav.fecha()
+
+    assert len(ws.vals) == 2
+    assert ws.vals[1][d.COLS_GERAL.index("Similares")] == "b"
+    assert item_a["similares"] == ["b"]